@@ -0,0 +1,108 @@
+"""
+Splits long audio/video uploads into overlapping segments under the Whisper upload limit,
+and stitches the per-segment transcripts back together.
+
+ffmpeg is used when it is on PATH (any format, re-encoded to compact mono mp3). Without it,
+.wav is split on frame boundaries and .mp3 on byte ranges; other containers must be small
+enough to send whole.
+"""
+import difflib
+import io
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import wave
+from contextlib import contextmanager
+
+MAX_BYTES = 24 * 1024 * 1024
+SEGMENT_SECONDS = 600
+OVERLAP_SECONDS = 5
+MP3_OVERLAP_BYTES = 256 * 1024
+
+def _ffmpeg_duration(path):
+    out = subprocess.run(["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path],
+                         capture_output=True, text=True, check=True).stdout
+    return float(out.strip())
+
+def _ffmpeg_cut(path, start, length):
+    cmd = ["ffmpeg", "-v", "error", "-ss", str(start), "-t", str(length), "-i", path,
+           "-vn", "-ac", "1", "-ar", "16000", "-b:a", "64k", "-f", "mp3", "pipe:1"]
+    return subprocess.run(cmd, capture_output=True, check=True).stdout
+
+def _windows(total, size, overlap):
+    start = 0
+    while start < total:
+        yield start, min(size, total - start)
+        if start + size >= total: break
+        start += size - overlap
+
+def _wav_jobs(path):
+    with wave.open(path, "rb") as w:
+        params, rate, frames = w.getparams(), w.getframerate(), w.getnframes()
+    bytes_per_sec = rate * params.sampwidth * params.nchannels
+    seg = int(min(SEGMENT_SECONDS, MAX_BYTES / bytes_per_sec) * rate)
+    def cut(start, length):
+        def job():
+            buf = io.BytesIO()
+            with wave.open(path, "rb") as src, wave.open(buf, "wb") as dst:
+                dst.setparams(params)
+                src.setpos(start)
+                dst.writeframes(src.readframes(length))
+            return f"seg_{start}.wav", buf.getvalue()
+        return job
+    return [cut(a, n) for a, n in _windows(frames, seg, OVERLAP_SECONDS * rate)]
+
+def _mp3_jobs(path):
+    # MPEG frames resync on their own, so raw byte ranges decode fine
+    def cut(start, length):
+        def job():
+            with open(path, "rb") as f:
+                f.seek(start)
+                return f"seg_{start}.mp3", f.read(length)
+        return job
+    return [cut(a, n) for a, n in _windows(os.path.getsize(path), MAX_BYTES, MP3_OVERLAP_BYTES)]
+
+@contextmanager
+def segment_jobs(file):
+    """
+    Yields a list of zero-argument callables, each returning (filename, bytes) for one
+    segment in playback order. Segments are cut lazily so workers can cut and upload in parallel.
+    """
+    name = os.path.basename(file.name).lower()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "upload" + os.path.splitext(name)[1])
+        with open(path, "wb") as out:
+            shutil.copyfileobj(file, out)
+
+        if os.path.getsize(path) <= MAX_BYTES:
+            def whole():
+                with open(path, "rb") as f: return name, f.read()
+            yield [whole]
+        elif shutil.which("ffmpeg") and shutil.which("ffprobe"):
+            yield [lambda a=a, n=n: (f"seg_{int(a)}.mp3", _ffmpeg_cut(path, a, n))
+                   for a, n in _windows(_ffmpeg_duration(path), SEGMENT_SECONDS, OVERLAP_SECONDS)]
+        elif name.endswith(".wav"):
+            yield _wav_jobs(path)
+        elif name.endswith(".mp3"):
+            yield _mp3_jobs(path)
+        else:
+            raise ValueError("Files over 25MB in this format need ffmpeg installed to be split.")
+
+def _norm(word):
+    return re.sub(r"\W+", "", word.lower())
+
+def stitch(texts, window=60, min_match=3):
+    # Overlapping segments repeat a few seconds of speech; drop the repeat at each seam
+    words = texts[0].split() if texts else []
+    for text in texts[1:]:
+        nxt = text.split()
+        tail, head = words[-window:], nxt[:window]
+        m = difflib.SequenceMatcher(None, [_norm(w) for w in tail], [_norm(w) for w in head], autojunk=False)
+        match = m.find_longest_match(0, len(tail), 0, len(head))
+        if match.size >= min_match:
+            words = words[:len(words) - len(tail) + match.a + match.size] + nxt[match.b + match.size:]
+        else:
+            words += nxt
+    return " ".join(words)
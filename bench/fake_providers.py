@@ -0,0 +1,248 @@
+"""
+Local stand-ins for Perplexity, Anthropic, OpenAI and the Ghost admin API.
+
+Replays the recorded responses in fixtures/responses.json with configurable latency so the
+pipeline can be timed without spending money. Point the app at it with:
+
+    PERPLEXITY_BASE_URL=http://127.0.0.1:<port>
+    ANTHROPIC_BASE_URL=http://127.0.0.1:<port>
+    OPENAI_BASE_URL=http://127.0.0.1:<port>/v1
+    GHOST_API_URL=http://127.0.0.1:<port>
+"""
+import json
+import os
+import random
+import re
+import struct
+import threading
+import time
+import urllib.parse
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "responses.json")
+
+# Seconds per call; Anthropic streams spread their latency across the chunks
+DEFAULT_LATENCY = {"perplexity": 1.5, "anthropic": 6.0, "openai_image": 4.0, "openai_audio": 3.0, "cdn": 0.2, "ghost": 0.3}
+
+def _png(width=160, height=90, rgb=(0, 229, 255)):
+    raw = b"".join(b"\x00" + bytes(rgb) * width for _ in range(height))
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
+
+def _tokens(text):
+    return max(1, len(text) // 4)
+
+class FakeProviders(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=None, jitter=0.1):
+        super().__init__(("127.0.0.1", port), _Handler)
+        with open(FIXTURES, encoding="utf-8") as f: self.fixtures = json.load(f)
+        self.latency = {**DEFAULT_LATENCY, **(latency or {})}
+        self.jitter = jitter
+        self.image = _png()
+        self.ghost_posts = {}
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def wait(self, route, fraction=1.0):
+        with self._lock: self.calls[route] = self.calls.get(route, 0) + 1
+        base = self.latency.get(route, 0) * fraction
+        time.sleep(max(0.0, base * random.uniform(1 - self.jitter, 1 + self.jitter)))
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _body(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(n) if n else b""
+
+    def _send(self, status, payload, content_type="application/json"):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    # --- routing ---
+    def do_GET(self):
+        srv = self.server
+        if self.path.startswith("/oaidalleapiprod/"):
+            srv.wait("cdn")
+            return self._send(200, srv.image, "image/png")
+        if self.path.startswith("/content/images/"):
+            return self._send(200, srv.image, "image/png")
+        if self.path.split("?")[0] == "/ghost/api/admin/posts/": return self._ghost_browse(urllib.parse.urlsplit(self.path).query)
+        if self.path.startswith("/ghost/api/admin/posts/"): return self._ghost_get(self.path.split("?")[0])
+        self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        path, body = self.path.split("?")[0], self._body()
+        if path == "/chat/completions": return self._perplexity(json.loads(body))
+        if path == "/v1/messages": return self._anthropic(json.loads(body))
+        if path == "/v1/images/generations": return self._image()
+        if path == "/v1/audio/transcriptions": return self._audio()
+        if path == "/ghost/api/admin/images/upload/": return self._ghost_image()
+        if path == "/ghost/api/admin/posts/": return self._ghost_post(json.loads(body))
+        self._send(404, {"error": "not found"})
+
+    def do_PUT(self):
+        path, body = self.path.split("?")[0], self._body()
+        if path.startswith("/ghost/api/admin/posts/"): return self._ghost_put(path.rstrip("/").rsplit("/", 1)[1], json.loads(body))
+        self._send(404, {"error": "not found"})
+
+    # --- Perplexity (OpenAI-compatible chat) ---
+    def _perplexity(self, req):
+        srv, prompt = self.server, json.dumps(req["messages"])
+        kind = "research" if "Research:" in prompt else "seo" if "SEO keywords" in prompt else "headlines"
+        text = srv.fixtures["perplexity"][kind]
+        srv.wait("perplexity")
+        self._send(200, {
+            "id": uuid.uuid4().hex, "object": "chat.completion", "created": int(time.time()), "model": req["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": _tokens(prompt), "completion_tokens": _tokens(text), "total_tokens": _tokens(prompt) + _tokens(text)},
+        })
+
+    # --- Anthropic Messages ---
+    def _anthropic_kind(self, req):
+        prompt = json.dumps(req.get("system", "")) + json.dumps(req["messages"])
+        if "Create social posts" in prompt: return "socials"
+        if "Refine this blog post" in prompt: return "refine"
+        if "Extract the facts" in prompt: return "distill"
+        if "route blog edit requests" in prompt: return "refine_route"
+        if "Rewrite only the blog post sections" in prompt: return "refine_sections"
+        return "writer"
+
+    def _anthropic(self, req):
+        srv = self.server
+        text = srv.fixtures["anthropic"][self._anthropic_kind(req)]
+        usage = {"input_tokens": _tokens(json.dumps(req)), "output_tokens": _tokens(text)}
+        # A forced tool call answers with the fixture as tool input instead of text
+        tool = (req.get("tool_choice") or {}).get("name")
+        if tool: text = json.dumps({k: v for k, v in json.loads(text).items() if k in req["tools"][0]["input_schema"]["properties"]})
+        block = {"type": "tool_use", "id": "toolu_" + uuid.uuid4().hex[:20], "name": tool} if tool else {"type": "text"}
+        message = {"id": "msg_" + uuid.uuid4().hex[:20], "type": "message", "role": "assistant", "model": req["model"],
+                   "stop_reason": "tool_use" if tool else "end_turn", "stop_sequence": None}
+        if not req.get("stream"):
+            srv.wait("anthropic")
+            content = {**block, "input": json.loads(text)} if tool else {**block, "text": text}
+            return self._send(200, {**message, "content": [content], "usage": usage})
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        def event(name, data):
+            self.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode())
+            self.wfile.flush()
+        srv.wait("anthropic", 0.15)  # time to first token
+        event("message_start", {"type": "message_start", "message": {**message, "content": [], "stop_reason": None,
+                                                                     "usage": {"input_tokens": usage["input_tokens"], "output_tokens": 1}}})
+        event("content_block_start", {"type": "content_block_start", "index": 0,
+                                      "content_block": {**block, "input": {}} if tool else {**block, "text": ""}})
+        chunks = [text[i:i + 200] for i in range(0, len(text), 200)]
+        for chunk in chunks:
+            time.sleep(srv.latency["anthropic"] * 0.85 / len(chunks))
+            delta = {"type": "input_json_delta", "partial_json": chunk} if tool else {"type": "text_delta", "text": chunk}
+            event("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": delta})
+        event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        event("message_delta", {"type": "message_delta", "delta": {"stop_reason": message["stop_reason"], "stop_sequence": None},
+                                "usage": {"output_tokens": usage["output_tokens"]}})
+        event("message_stop", {"type": "message_stop"})
+        self.close_connection = True
+
+    # --- OpenAI images / audio ---
+    def _image(self):
+        srv = self.server
+        srv.wait("openai_image")
+        self._send(200, {"created": int(time.time()), "data": [{"url": f"{srv.base_url}/oaidalleapiprod/{uuid.uuid4().hex}.png"}]})
+
+    def _audio(self):
+        srv = self.server
+        srv.wait("openai_audio")
+        fx = srv.fixtures["openai"]
+        self._send(200, {"task": "transcribe", "language": "english", "duration": fx["duration"], "text": fx["transcript"], "segments": []})
+
+    # --- Ghost admin ---
+    def _ghost_image(self):
+        srv = self.server
+        srv.wait("ghost")
+        self._send(201, {"images": [{"url": f"{srv.base_url}/content/images/{uuid.uuid4().hex}.png", "ref": None}]})
+
+    # Posts keep Ghost's semantics the publisher relies on: unique slugs, updated_at collision checks
+    def _ghost_stamp(self):
+        now = time.time()
+        return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(now)) + f".{int(now * 1000) % 1000:03d}Z"
+
+    def _ghost_post(self, req):
+        srv = self.server
+        srv.wait("ghost")
+        post = {**req["posts"][0], "id": uuid.uuid4().hex[:24], "updated_at": self._ghost_stamp()}
+        post.setdefault("status", "draft")
+        with srv._lock:
+            slug, n = post.get("slug") or post["id"], 1
+            while any(p["slug"] == (slug if n == 1 else f"{slug}-{n}") for p in srv.ghost_posts.values()): n += 1
+            post["slug"] = slug if n == 1 else f"{slug}-{n}"
+            post["url"] = f"{srv.base_url}/{post['slug']}/"
+            srv.ghost_posts[post["id"]] = post
+        self._send(201, {"posts": [post]})
+
+    @staticmethod
+    def _tag_slug(name):
+        # Ghost's tag slugs: internal tags (leading #) become hash-...
+        return ("hash-" if name.startswith("#") else "") + re.sub(r"[^a-z0-9]+", "-", name.lstrip("#").lower()).strip("-")
+
+    def _ghost_browse(self, query):
+        # Only the filter the publisher sends: tag:<slug>, oldest first
+        srv = self.server
+        srv.wait("ghost")
+        params = urllib.parse.parse_qs(query)
+        tag = (params.get("filter") or [""])[0].removeprefix("tag:")
+        with srv._lock:
+            posts = [p for p in srv.ghost_posts.values() if not tag or any(self._tag_slug(t["name"]) == tag for t in p.get("tags") or [])]
+        self._send(200, {"posts": posts[:int((params.get("limit") or ["15"])[0])]})
+
+    def _ghost_get(self, path):
+        srv = self.server
+        srv.wait("ghost")
+        parts = path.rstrip("/").split("/")
+        with srv._lock:
+            if parts[-2] == "slug": post = next((p for p in srv.ghost_posts.values() if p["slug"] == parts[-1]), None)
+            else: post = srv.ghost_posts.get(parts[-1])
+        if not post: return self._send(404, {"errors": [{"type": "NotFoundError", "message": "Post not found."}]})
+        self._send(200, {"posts": [post]})
+
+    def _ghost_put(self, post_id, req):
+        srv = self.server
+        srv.wait("ghost")
+        changes = req["posts"][0]
+        with srv._lock:
+            post = srv.ghost_posts.get(post_id)
+            if post and changes.get("updated_at") != post["updated_at"]:
+                return self._send(409, {"errors": [{"type": "UpdateCollisionError", "message": "Saving failed! Someone else is editing this post."}]})
+            if post:
+                post.update({k: v for k, v in changes.items() if k not in ("id", "slug", "url")}, updated_at=self._ghost_stamp())
+        if not post: return self._send(404, {"errors": [{"type": "NotFoundError", "message": "Post not found."}]})
+        self._send(200, {"posts": [post]})
+
+if __name__ == "__main__":
+    server = FakeProviders(port=int(os.environ.get("PORT", "8765"))).start()
+    print(f"Fake providers on {server.base_url}")
+    threading.Event().wait()
@@ -0,0 +1,173 @@
+"""
+Offline end-to-end benchmark: research -> write -> socials + art -> publish, against the
+recorded stand-ins in fake_providers.py. No API keys or network access are needed.
+
+    python bench/run_bench.py --runs 8 --concurrency 4 --out bench_output.json
+    python bench/run_bench.py --runs 8 --concurrency 4 --baseline bench_output.json
+
+Each run drives sharp-blog.py through Streamlit's AppTest exactly as an editor would (type a
+topic, press Start, wait for the job, press Publish). AppTest leans on Streamlit's process-wide
+Runtime, so each concurrent client runs in its own process against the shared data dir and fake
+server. Reports end-to-end latency, per-stage time (from the job record), peak RSS per client
+process and throughput, and compares with a baseline. Memory is read from the OS only: tracing
+allocations in the timed process would slow it several times over.
+With --republish every post is published twice; ghost_posts in the summary should still equal runs.
+"""
+import argparse
+import importlib
+import json
+import os
+import resource
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+sys.path.insert(0, os.path.dirname(__file__))
+from fake_providers import DEFAULT_LATENCY, FakeProviders
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sharp-blog.py")
+STAGES = ("context", "research", "draft", "finish", "publish")
+
+def parse_latency(spec, scale):
+    latency = dict(DEFAULT_LATENCY)
+    for part in filter(None, (spec or "").split(",")):
+        route, seconds = part.split("=")
+        latency[route.strip()] = float(seconds)
+    return {k: v * scale for k, v in latency.items()}
+
+def button(at, label):
+    return next(b for b in at.button if b.label == label)
+
+def job_row(data_dir, job_id):
+    with sqlite3.connect(os.path.join(data_dir, "sharp_blog.db")) as c:
+        return c.execute("SELECT status, error, costs FROM jobs WHERE id=?", (job_id,)).fetchone()
+
+WARM_IMPORTS = ("streamlit.testing.v1", "openai", "anthropic", "textstat", "PIL.Image")
+
+def init_client(env):
+    # Runs in each client process; spawned, so nothing is inherited from the server's threads.
+    # The SDKs the app imports lazily are loaded here so no run pays for them inside a stage.
+    os.environ.update(env)
+    for name in WARM_IMPORTS:
+        try: importlib.import_module(name)
+        except ImportError: pass
+
+def one_run(i, args, secrets, data_dir):
+    from streamlit.testing.v1 import AppTest
+
+    t0 = time.perf_counter()
+    at = AppTest.from_file(APP, default_timeout=args.timeout)
+    for k, v in secrets.items(): at.secrets[k] = v
+    at.run()
+    topic = args.topic if args.warm else f"{args.topic} (run {i})"
+    at.text_area(key="topic").input(topic)
+    if args.variants > 1: at.slider(key="draft_variants").set_value(args.variants)
+    button(at, "Start Sharp Bloggling").click().run()
+    job_id = at.session_state["active_job"]
+
+    # Watch the job row, not the page: rerunning the whole script ten times a second would starve
+    # the job threads it is timing. The app only needs one rerun to pick up the finished job.
+    deadline = t0 + args.timeout
+    while at.session_state["elite_blog_v8"] is None:
+        status, error, _ = job_row(data_dir, job_id)
+        if status == "failed": raise RuntimeError(f"run {i} failed: {error}")
+        if time.perf_counter() > deadline: raise TimeoutError(f"run {i} timed out")
+        if status == "done": at.run()
+        else: time.sleep(0.05)
+    t_draft = time.perf_counter()
+
+    button(at, "🚀 Publish to Ghost").click().run()
+    t_end = time.perf_counter()
+    if not at.success: raise RuntimeError(f"run {i} publish failed")
+    if args.republish:
+        button(at, "🚀 Publish to Ghost").click().run()
+        if not at.info: raise RuntimeError(f"run {i} republish was not recognised as unchanged")
+
+    stages = json.loads(job_row(data_dir, job_id)[2]).get("stages", {})
+    stages["publish"] = t_end - t_draft
+    return {"run": i, "e2e": t_end - t0, "stages": stages, "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+def summarize(results, wall):
+    e2e = [r["e2e"] for r in results]
+    return {
+        "runs": len(results),
+        "wall_s": round(wall, 3),
+        "throughput_posts_per_hour": round(len(results) / wall * 3600, 1),
+        "e2e_s": {"mean": round(statistics.mean(e2e), 3), "p50": round(pct(e2e, 0.5), 3), "p95": round(pct(e2e, 0.95), 3)},
+        "stages_s": {s: round(statistics.mean(r["stages"].get(s, 0.0) for r in results), 3) for s in STAGES},
+        "max_rss_mb": round(max(r["rss_kb"] for r in results) / 1024, 1),   # worst single client process
+    }
+
+def compare(current, baseline):
+    def delta(a, b):
+        return f"{(a - b) / b * 100:+.1f}%" if b else "n/a"
+    rows = [("throughput_posts_per_hour", current["throughput_posts_per_hour"], baseline["throughput_posts_per_hour"]),
+            ("e2e mean", current["e2e_s"]["mean"], baseline["e2e_s"]["mean"]),
+            ("e2e p95", current["e2e_s"]["p95"], baseline["e2e_s"]["p95"]),
+            ("max_rss_mb", current["max_rss_mb"], baseline.get("max_rss_mb", 0.0))]
+    rows += [(f"stage {s}", current["stages_s"][s], baseline["stages_s"].get(s, 0.0)) for s in STAGES]
+    for name, a, b in rows:
+        print(f"  {name:<28} {b:>10} -> {a:<10} {delta(a, b)}")
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=4)
+    ap.add_argument("--concurrency", type=int, default=1)
+    ap.add_argument("--latency", help="per-route seconds, e.g. anthropic=6,perplexity=1.5")
+    ap.add_argument("--latency-scale", type=float, default=1.0, help="multiply every latency (0 = as fast as possible)")
+    ap.add_argument("--topic", default="Observability for growing engineering teams")
+    ap.add_argument("--warm", action="store_true", help="reuse one topic so caches are exercised")
+    ap.add_argument("--timeout", type=float, default=300)
+    ap.add_argument("--variants", type=int, default=1, help="drafts written in parallel per post")
+    ap.add_argument("--republish", action="store_true", help="publish each post twice to check upserts")
+    ap.add_argument("--out", help="write the summary JSON here")
+    ap.add_argument("--baseline", help="summary JSON from an earlier run to compare against")
+    args = ap.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="sharp_bench_")
+    server = FakeProviders(latency=parse_latency(args.latency, args.latency_scale)).start()
+    env = {
+        "SHARP_BLOG_DATA": data_dir,
+        "PERPLEXITY_BASE_URL": server.base_url,
+        "ANTHROPIC_BASE_URL": server.base_url,
+        "OPENAI_BASE_URL": server.base_url + "/v1",
+    }
+    secrets = {
+        "GHOST_ADMIN_API_KEY": "benchkey:" + "ab" * 32, "GHOST_API_URL": server.base_url,
+        "PERPLEXITY_API_KEY": "bench", "ANTHROPIC_API_KEY": "bench", "OPENAI_API_KEY": "bench",
+    }
+
+    with ProcessPoolExecutor(max_workers=args.concurrency, mp_context=get_context("spawn"),
+                             initializer=init_client, initargs=(env,)) as pool:
+        # Start (and warm) every client process before the clock does
+        futures = [pool.submit(time.sleep, 0.5) for _ in range(args.concurrency)]
+        for f in futures: f.result()
+        start = time.perf_counter()
+        futures = [pool.submit(one_run, i, args, secrets, data_dir) for i in range(args.runs)]
+        results = [f.result() for f in futures]
+        wall = time.perf_counter() - start
+
+    summary = {**summarize(results, wall), "concurrency": args.concurrency, "variants": args.variants, "provider_calls": server.calls,
+               "ghost_posts": len(server.ghost_posts)}
+    print(json.dumps(summary, indent=2))
+    if args.out:
+        with open(args.out, "w") as f: json.dump(summary, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f: baseline = json.load(f)
+        print(f"\nvs baseline {args.baseline}:")
+        compare(summary, baseline)
+    server.shutdown()
+
+if __name__ == "__main__":
+    # Run as the importable module so the pool pickles run_bench.one_run: AppTest replaces
+    # sys.modules["__main__"] with the app inside every client process
+    from run_bench import main as run
+    run()
@@ -0,0 +1,72 @@
+"""
+Streaming text extraction for uploaded context files.
+
+Every extractor is a generator, so callers stop reading (and parsing) once they have
+enough characters. pypdf and python-docx are imported on first use, not at app start.
+"""
+import codecs
+
+TEXT_CHUNK = 64 * 1024
+
+# --- PDF ---
+def iter_pdf(file):
+    # Pages are parsed one at a time in the calling thread: extraction stops at the character
+    # budget after a few pages, and a spawned pool would re-run the whole Streamlit app (it is
+    # __main__) in every worker.
+    from pypdf import PdfReader
+    for page in PdfReader(file).pages:
+        yield (page.extract_text() or "") + "\n"
+
+# --- DOCX ---
+def iter_docx(file):
+    from docx import Document
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+    doc = Document(file)
+    # Walk the body in document order so tables land where they appear
+    for el in doc.element.body.iterchildren():
+        if el.tag.endswith('}p'):
+            yield Paragraph(el, doc).text + "\n"
+        elif el.tag.endswith('}tbl'):
+            for row in Table(el, doc).rows:
+                cells = []
+                for cell in row.cells:
+                    txt = cell.text.strip()
+                    if not cells or cells[-1] != txt: cells.append(txt)  # merged cells repeat
+                yield " | ".join(cells) + "\n"
+
+# --- TXT / MD ---
+def sniff_encoding(head):
+    for bom, enc in ((codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16')):
+        if head.startswith(bom): return enc
+    try:
+        head.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError as e:
+        # A multi-byte character split at the sample edge is still UTF-8
+        return 'utf-8' if e.start >= len(head) - 3 and e.reason == 'unexpected end of data' else 'cp1252'
+
+def iter_plain(file):
+    chunk = file.read(TEXT_CHUNK)
+    decoder = codecs.getincrementaldecoder(sniff_encoding(chunk))(errors='replace')
+    while chunk:
+        yield decoder.decode(chunk)
+        chunk = file.read(TEXT_CHUNK)
+    yield decoder.decode(b'', final=True)
+
+def extract_text(file, limit):
+    name = file.name.lower()
+    if name.endswith('.pdf'): parts = iter_pdf(file)
+    elif name.endswith('.docx'): parts = iter_docx(file)
+    elif name.endswith(('.txt', '.md')): parts = iter_plain(file)
+    else: return ""
+
+    out, size = [], 0
+    try:
+        for part in parts:
+            out.append(part)
+            size += len(part)
+            if size >= limit: break
+    finally:
+        parts.close()
+    return "".join(out)[:limit].rstrip("\n")
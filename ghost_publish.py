@@ -0,0 +1,161 @@
+"""
+Ghost Admin API publishing with idempotent upserts, bulk publishing and scheduling.
+
+Every post is published under a stable key (a draft or job id). A local SQLite index maps the
+key to the Ghost post and a hash of what was last sent, so:
+
+- publishing unchanged content again makes no request at all,
+- changed content is a PUT to the same post, passing Ghost's updated_at collision check,
+- a retry after a timeout (the POST landed, the index was never written) finds the post by the
+  key's internal tag instead of creating a duplicate, whatever slug or title it ended up with.
+
+publish_many() pushes several posts concurrently over the one shared HTTP session.
+"""
+import datetime
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+STATUSES = ("draft", "scheduled", "published")
+KEY_TAG = "#sharp-{}"   # internal tags (leading #) are never shown on the site
+
+class GhostError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"Ghost {status}: {message}")
+        self.status = status
+
+def slugify(text, limit=80):
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode().lower()
+    return re.sub(r"[^a-z0-9]+", "-", text).strip("-")[:limit].strip("-") or "post"
+
+def tag_slug(name):
+    # How Ghost slugs a tag name; internal tags get a "hash-" prefix in place of the #
+    return ("hash-" if name.startswith("#") else "") + slugify(name.lstrip("#"), limit=185)
+
+def iso_utc(when):
+    # Naive datetimes are taken as UTC; Ghost wants millisecond ISO 8601 with a Z
+    if when is None or isinstance(when, str): return when
+    if when.tzinfo is None: when = when.replace(tzinfo=datetime.timezone.utc)
+    return when.astimezone(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+def content_hash(post, status, published_at, tags, image):
+    fields = {k: post.get(k) or "" for k in ("title", "html_content", "excerpt", "meta_title", "meta_description")}
+    return hashlib.sha256(json.dumps([fields, status, published_at, tags, image], sort_keys=True).encode()).hexdigest()
+
+class GhostPublisher:
+    def __init__(self, api_url, token, session, index_path, timeout=(5, 60), upload_image=None, workers=4):
+        self.api = f"{api_url.rstrip('/')}/ghost/api/admin"
+        self.token = token                  # callable returning a current admin JWT
+        self.http, self.timeout, self.workers = session, timeout, workers
+        self.upload_image = upload_image    # callable(image) -> hosted URL, for local images; raises on failure
+        self.index_path = index_path
+        self._locks, self._guard = {}, threading.Lock()
+        with closing(self._db()) as c:
+            c.execute("""CREATE TABLE IF NOT EXISTS ghost_index (
+                key TEXT PRIMARY KEY, ghost_id TEXT NOT NULL, slug TEXT, url TEXT, status TEXT, updated_at TEXT,
+                content_hash TEXT, image TEXT, feature_image TEXT, synced REAL NOT NULL)""")
+
+    def _db(self):
+        return sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+
+    def _lock(self, key):
+        # Two publishes of one key never race each other into two POSTs
+        with self._guard: return self._locks.setdefault(key, threading.Lock())
+
+    def _request(self, method, path, body=None):
+        res = self.http.request(method, f"{self.api}{path}", json=body, timeout=self.timeout,
+                                headers={"Authorization": f"Ghost {self.token()}"})
+        if res.status_code == 404: return None
+        if res.status_code >= 400:
+            try: message = res.json()["errors"][0].get("message") or res.text
+            except Exception: message = res.text
+            raise GhostError(res.status_code, message[:300])
+        posts = res.json()["posts"]
+        return posts[0] if posts else None
+
+    def indexed(self, key):
+        with closing(self._db()) as c:
+            c.row_factory = sqlite3.Row
+            row = c.execute("SELECT * FROM ghost_index WHERE key=?", (key,)).fetchone()
+        return dict(row) if row else None
+
+    def _remember(self, key, saved, digest, image, feature):
+        with closing(self._db()) as c:
+            c.execute("INSERT OR REPLACE INTO ghost_index (key, ghost_id, slug, url, status, updated_at, content_hash, image, feature_image, synced) "
+                      "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                      (key, saved["id"], saved.get("slug"), saved.get("url"), saved.get("status"), saved.get("updated_at"),
+                       digest, image, feature, time.time()))
+
+    def _find_orphan(self, key):
+        # A post created by a request whose response never arrived. Its slug may have been
+        # de-duplicated and its title since changed, but it still carries the key's tag
+        query = urllib.parse.urlencode({"filter": f"tag:{tag_slug(KEY_TAG.format(key))}", "limit": 1, "order": "created_at asc"})
+        return self._request("GET", f"/posts/?{query}")
+
+    def _update(self, ghost_id, updated_at, body):
+        for attempt in range(2):
+            try: return self._request("PUT", f"/posts/{ghost_id}/?source=html", {"posts": [{**body, "updated_at": updated_at}]})
+            except GhostError as e:
+                # Edited in Ghost since we last saw it: take the current updated_at and overwrite once
+                if e.status != 409 or attempt: raise
+                current = self._request("GET", f"/posts/{ghost_id}/")
+                if not current: return None
+                updated_at = current["updated_at"]
+
+    def publish(self, post, key, status="draft", published_at=None, tags=(), image=None):
+        """
+        Creates or updates the Ghost post for key. image is a hosted URL or anything upload_image
+        accepts. Returns {"key", "id", "slug", "url", "status", "action"} where action is
+        created, updated or unchanged.
+        """
+        if status not in STATUSES: raise ValueError(f"status must be one of {STATUSES}")
+        if status == "scheduled" and not published_at: raise ValueError("scheduled posts need published_at")
+        published_at = iso_utc(published_at)
+        tags = list(dict.fromkeys([*tags, KEY_TAG.format(key)]))
+        digest = content_hash(post, status, published_at, tags, image)
+
+        with self._lock(key):
+            row = self.indexed(key)
+            if row and row["content_hash"] == digest:
+                return {"key": key, "id": row["ghost_id"], "slug": row["slug"], "url": row["url"], "status": row["status"], "action": "unchanged"}
+
+            if row and row["image"] == image: feature = row["feature_image"]   # already hosted
+            elif image and self.upload_image: feature = self.upload_image(image)
+            else: feature = image
+            # Indexing a post whose image never landed would make every republish "unchanged"
+            if image and not feature: raise GhostError(502, "image upload returned no URL")
+            body = {
+                "title": post["title"], "html": post["html_content"], "custom_excerpt": (post.get("excerpt") or "")[:300],
+                "meta_title": post.get("meta_title"), "meta_description": post.get("meta_description"),
+                "feature_image": feature, "status": status, "tags": [{"name": t} for t in tags],
+            }
+            if published_at: body["published_at"] = published_at
+
+            saved, action = None, "updated"
+            if row: saved = self._update(row["ghost_id"], row["updated_at"], body)
+            if not saved:
+                orphan = self._find_orphan(key)
+                if orphan: saved = self._update(orphan["id"], orphan["updated_at"], body)
+            if not saved:
+                saved, action = self._request("POST", "/posts/?source=html", {"posts": [{**body, "slug": slugify(post["title"])}]}), "created"
+                if not saved: raise GhostError(404, "posts endpoint not found; check GHOST_API_URL")
+            self._remember(key, saved, digest, image, feature)
+        return {"key": key, "id": saved["id"], "slug": saved.get("slug"), "url": saved.get("url"), "status": saved.get("status"), "action": action}
+
+    def publish_many(self, items, executor=None):
+        """
+        Publishes [{"post", "key", "status", "published_at", "tags", "image"}, ...] concurrently.
+        Results come back in input order; a failed item reports action "failed" and the error.
+        """
+        def one(item):
+            try: return self.publish(**item)
+            except Exception as e: return {"key": item["key"], "action": "failed", "error": str(e)}
+        pool = executor or ThreadPoolExecutor(max_workers=self.workers)
+        with pool: return list(pool.map(one, items))
@@ -0,0 +1,111 @@
+"""
+Content-addressed cache for generated art.
+
+Each image is fetched once and keyed by the SHA-256 of its bytes. As it is stored it is center-cropped
+to 16:9 and written as WebP and JPEG variants at publish and preview widths; the original is only
+kept when Pillow is missing. Files are named <digest>-<variant>.<ext> in one flat directory.
+"""
+import hashlib
+import io
+import os
+import tempfile
+from functools import lru_cache
+
+ASPECT = 16 / 9
+VARIANTS = {"publish": 1600, "preview": 800}   # target widths, never upscaled
+FORMATS = {"webp": ("WEBP", {"quality": 82, "method": 6}), "jpg": ("JPEG", {"quality": 85, "optimize": True, "progressive": True})}
+MIME = {"webp": "image/webp", "jpg": "image/jpeg", "png": "image/png"}
+FETCH_CHUNK = 64 * 1024
+
+@lru_cache(maxsize=None)
+def _pil():
+    # Pillow is optional and only imported once the first image arrives
+    try:
+        from PIL import Image
+        return Image
+    except ImportError:
+        return None
+
+def _sniff(data):
+    if data[:8] == b"\x89PNG\r\n\x1a\n": return "png"
+    if data[:3] == b"\xff\xd8\xff": return "jpg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP": return "webp"
+    return None
+
+def _write(path, data):
+    # Atomic so a concurrent reader never sees a half-written file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    with os.fdopen(fd, "wb") as f: f.write(data)
+    os.replace(tmp, path)
+
+def _crop(img):
+    w, h = img.size
+    if w / h > ASPECT:
+        cw = round(h * ASPECT)
+        return img.crop(((w - cw) // 2, 0, (w - cw) // 2 + cw, h))
+    ch = round(w / ASPECT)
+    return img.crop((0, (h - ch) // 2, w, (h - ch) // 2 + ch))
+
+def _save_variants(Image, fp, digest, root):
+    with Image.open(fp) as src:
+        base = _crop(src.convert("RGB"))
+    for variant, width in VARIANTS.items():
+        width = min(width, base.width)
+        img = base.resize((width, round(width / ASPECT)), Image.LANCZOS) if width != base.width else base
+        for ext, (fmt, opts) in FORMATS.items():
+            buf = io.BytesIO()
+            img.save(buf, fmt, **opts)
+            _write(os.path.join(root, f"{digest}-{variant}.{ext}"), buf.getvalue())
+
+def fetch(url, root, session, timeout):
+    """Streams url into the cache and returns its digest; the download is never held in memory whole."""
+    os.makedirs(root, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=root, suffix=".part")
+    try:
+        sha, head = hashlib.sha256(), b""
+        with os.fdopen(fd, "wb") as f, session.get(url, stream=True, timeout=timeout) as res:
+            res.raise_for_status()
+            for chunk in res.iter_content(FETCH_CHUNK):
+                head += chunk[:12 - len(head)]
+                sha.update(chunk)
+                f.write(chunk)
+        ext, digest = _sniff(head), sha.hexdigest()
+        if not ext: raise ValueError("not a PNG, JPEG or WebP image")
+        if find(root, digest): return digest
+        Image = _pil()
+        if Image is None: os.replace(tmp, os.path.join(root, f"{digest}-original.{ext}"))
+        else: _save_variants(Image, tmp, digest, root)
+        return digest
+    finally:
+        if os.path.exists(tmp): os.remove(tmp)
+
+def is_digest(value):
+    return isinstance(value, str) and len(value) == 64 and all(c in "0123456789abcdef" for c in value)
+
+def find(root, digest, variant="publish", fmt="webp"):
+    """Path of the best available file for a variant, or None when the digest is unknown."""
+    names = [f"{digest}-{variant}.{fmt}"] + [f"{digest}-{variant}.{f}" for f in FORMATS if f != fmt]
+    names += [f"{digest}-original.{f}" for f in MIME]
+    for name in names:
+        path = os.path.join(root, name)
+        if os.path.exists(path): return path
+    return None
+
+def mime_of(path):
+    return MIME.get(os.path.splitext(path)[1].lstrip("."), "application/octet-stream")
+
+def prune(root, max_bytes):
+    # Drop whole images, least recently written first, until the directory fits
+    if not os.path.isdir(root): return
+    groups = {}
+    for entry in os.scandir(root):
+        if entry.is_file() and "-" in entry.name:
+            st = entry.stat()
+            size, mtime = groups.get(entry.name.split("-")[0], (0, 0))
+            groups[entry.name.split("-")[0]] = (size + st.st_size, max(mtime, st.st_mtime))
+    total = sum(size for size, _ in groups.values())
+    for digest, (size, _) in sorted(groups.items(), key=lambda kv: kv[1][1]):
+        if total <= max_bytes: break
+        for entry in os.scandir(root):
+            if entry.name.startswith(digest + "-"): os.remove(entry.path)
+        total -= size
@@ -0,0 +1,72 @@
+"""
+Lenient parsing of JSON written by a model.
+
+Models wrap JSON in code fences, stream it a token at a time and get cut off by max_tokens.
+repair_json() closes whatever a truncated generation left open and says which key was cut;
+partial_field() decodes one string value while it is still streaming in.
+"""
+import json
+import re
+
+def clean_json_response(txt):
+    txt = txt.strip()
+    if "```json" in txt: txt = txt.split("```json")[1].split("```")[0]
+    elif "```" in txt: txt = txt.split("```")[1].split("```")[0]
+    return txt.strip()
+
+_JSON_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f'}
+
+def partial_field(buf, key):
+    # Best-effort decode of a string value that may still be streaming in (no closing quote yet)
+    m = re.search(r'"%s"\s*:\s*"' % key, buf)
+    if not m: return None
+    out, i, n = [], m.end(), len(buf)
+    while i < n:
+        c = buf[i]
+        if c == '"': break
+        if c == '\\':
+            if i + 1 >= n: break
+            esc = buf[i + 1]
+            if esc == 'u':
+                if i + 6 > n: break
+                out.append(chr(int(buf[i + 2:i + 6], 16)))
+                i += 6
+                continue
+            out.append(_JSON_ESCAPES.get(esc, esc))
+            i += 2
+            continue
+        out.append(c)
+        i += 1
+    return "".join(out)
+
+def repair_json(txt):
+    """
+    Parses model JSON, closing whatever a truncated generation left open (strings, arrays,
+    objects, a dangling key) and dropping trailing commas. Returns (obj, cut) where cut is the
+    top-level key whose value was cut off mid-way, or None.
+    """
+    txt = clean_json_response(txt)
+    txt = txt[txt.find("{"):] if "{" in txt else txt
+    try: return json.loads(txt, strict=False), None
+    except json.JSONDecodeError: pass
+
+    stack, in_str, esc = [], False, False
+    for c in txt:
+        if in_str:
+            if esc: esc = False
+            elif c == '\\': esc = True
+            elif c == '"': in_str = False
+        elif c == '"': in_str = True
+        elif c in '{[': stack.append(c)
+        elif c in '}]' and stack: stack.pop()
+    body = txt[:-1] if esc else txt
+    if in_str: body = re.sub(r'\\u[0-9a-fA-F]{0,3}$', '', body) + '"'
+    closers = "".join('}' if c == '{' else ']' for c in reversed(stack))
+    candidates = (body, re.sub(r',?\s*"(?:[^"\\]|\\.)*"\s*:?\s*$', '', body), re.sub(r'[,:]\s*$', '', body))
+    for i, cand in enumerate(candidates):
+        try: obj = json.loads(re.sub(r',\s*([}\]])', r'\1', cand.rstrip().rstrip(',') + closers), strict=False)
+        except json.JSONDecodeError: continue
+        if not isinstance(obj, dict): break
+        inside_value = (in_str and i == 0) or len(stack) > 1
+        return obj, (list(obj)[-1] if obj and inside_value else None)
+    raise ValueError("unrepairable JSON")
@@ -0,0 +1,174 @@
+"""
+Deterministic enforcement of the writer's house rules on generated HTML.
+
+One html.parser pass rewrites em-dashes, bold outside headings, inline links and emojis, and
+moves every inline link into the Sources list at the bottom. What cannot be fixed without
+rewriting prose (walls of text, missing structure) is reported as issues for the model.
+"""
+import html
+import re
+from collections import Counter
+from html.parser import HTMLParser
+
+DASH = re.compile(r"\s*[—―]\s*|\s+[–]\s+|\s+--\s+|(?<=\w)--(?=\w)")
+DASH_ENTITY = re.compile(r"&(?:mdash|#8212|#x2014);", re.I)
+# Emoji-presentation code points only: the dingbat and arrow blocks also hold ordinary symbols
+# (★ ✓ →) that stay unless a U+FE0F asks for the emoji form
+PICTOGRAPH = ("[\u231A\u231B\u23E9-\u23EC\u23F0\u23F3\u25FD\u25FE\u2614\u2615\u2648-\u2653\u267F\u2693\u26A1"
+              "\u26AA\u26AB\u26BD\u26BE\u26C4\u26C5\u26CE\u26D4\u26EA\u26F2\u26F3\u26F5\u26FA\u26FD\u2705\u270A\u270B"
+              "\u2728\u274C\u274E\u2753-\u2755\u2757\u2795-\u2797\u27B0\u27BF\u2B1B\u2B1C\u2B50\u2B55"
+              "\U0001F004\U0001F0CF\U0001F18E\U0001F191-\U0001F19A\U0001F1E6-\U0001F1FF\U0001F201\U0001F21A\U0001F22F"
+              "\U0001F232-\U0001F236\U0001F238-\U0001F23A\U0001F250\U0001F251\U0001F300-\U0001F64F\U0001F680-\U0001F6FF"
+              "\U0001F7E0-\U0001F7EB\U0001F90C-\U0001F9FF\U0001FA70-\U0001FAFF]|[\u00A9\u00AE\u203C-\u2BFF]\uFE0F")
+EMOJI = re.compile(rf"(?:{PICTOGRAPH}|[0-9#*]\uFE0F?\u20E3)(?:[\uFE0F\U0001F3FB-\U0001F3FF\U000E0020-\U000E007F]|\u200D(?:{PICTOGRAPH}|[\u2000-\u2BFF]))*")
+MD_BOLD = re.compile(r"(?<![\w*])\*\*(?=\S)(.+?)(?<=\S)\*\*(?![\w*])")
+SOURCES_HEADING = re.compile(r"\b(sources|references|further reading|citations)\b", re.I)
+HEADINGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+BOLD = {"strong", "b"}
+BLOCKS = HEADINGS | {"p", "li", "td", "th", "blockquote"}
+RAW = {"pre", "code", "script", "style"}
+VOID = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+LONG_PARAGRAPH_WORDS = 150
+MIN_WORDS_FOR_HEADINGS = 300
+
+def fix_text(text, fixes=None):
+    """Applies the inline rules to plain text; counts into fixes when given."""
+    fixes = Counter() if fixes is None else fixes
+    text, n = DASH.subn(", ", text)
+    if n:
+        fixes["em_dash"] += n
+        text = re.sub(r",\s*(?=[.,;:!?)])", "", text)
+    text, n = MD_BOLD.subn(r"\1", text)
+    fixes["bold"] += n
+    text, n = EMOJI.subn("", text)
+    if n:
+        fixes["emoji"] += n
+        text = re.sub(r"(?<=\S) {2,}", " ", text)
+    return text
+
+class _Linter(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.out, self.fixes, self.issues = [], Counter(), []
+        self.stack = []            # [tag, dropped] for open elements
+        self.heading = None        # text of the heading being read
+        self.in_sources = False
+        self.sources_end = None    # out index of the Sources list's closing tag
+        self.source_urls = set()
+        self.moved = []            # [href, label] of links lifted out of the body
+        self.label = None          # the moved link whose text is being read
+        self.paragraph = None      # word count of the open <p>
+        self.words = 0
+        self.h2 = 0
+        self.block_start = False
+
+    def _inside(self, tags):
+        return any(t in tags for t, _ in self.stack)
+
+    def handle_starttag(self, tag, attrs):
+        raw = self.get_starttag_text()
+        if tag in VOID:
+            self.out.append(raw)
+            return
+        drop = False
+        if tag in BOLD and not self._inside(HEADINGS):
+            drop = True
+            self.fixes["bold"] += 1
+        elif tag == "a":
+            href = dict(attrs).get("href") or ""
+            if self.in_sources:
+                self.source_urls.add(href)
+            else:
+                drop = True
+                self.fixes["inline_link"] += 1
+                if href and not href.startswith("#"):
+                    self.label = [href, ""]
+                    self.moved.append(self.label)
+        if tag in HEADINGS:
+            self.heading = ""
+            if tag == "h2": self.h2 += 1
+        if tag == "p": self.paragraph = 0
+        self.stack.append([tag, drop])
+        self.block_start = tag in BLOCKS
+        if not drop: self.out.append(raw)
+
+    def handle_startendtag(self, tag, attrs):
+        self.out.append(self.get_starttag_text())
+
+    def handle_endtag(self, tag):
+        idx = next((i for i in range(len(self.stack) - 1, -1, -1) if self.stack[i][0] == tag), None)
+        self.block_start = False
+        if idx is None:
+            self.out.append(f"</{tag}>")  # stray end tag: keep it, not ours to repair
+            return
+        for open_tag, drop in reversed(self.stack[idx:]):
+            if open_tag in HEADINGS and self.heading is not None:
+                self.in_sources = bool(SOURCES_HEADING.search(self.heading))
+                self.heading = None
+            if open_tag in ("ul", "ol") and self.in_sources and self.sources_end is None:
+                self.sources_end = len(self.out)
+            if open_tag == "p" and self.paragraph is not None:
+                if self.paragraph > LONG_PARAGRAPH_WORDS: self.issues.append(f"A paragraph runs {self.paragraph} words; split it up.")
+                self.paragraph = None
+            if open_tag == "a": self.label = None
+            if not drop: self.out.append(f"</{open_tag}>")
+        del self.stack[idx:]
+
+    def handle_data(self, data):
+        if not self._inside(RAW):
+            data = fix_text(data, self.fixes)
+            if self.block_start: data = data.lstrip(", ")  # a dash that opened the block leaves no comma
+        self.block_start = False
+        if self.heading is not None: self.heading += data
+        n = len(data.split())
+        self.words += n
+        if self.paragraph is not None: self.paragraph += n
+        if self.label: self.label[1] += data
+        self.out.append(data)
+
+    def handle_entityref(self, name):
+        self.out.append(f"&{name};")
+
+    def handle_charref(self, name):
+        self.out.append(f"&#{name};")
+
+    def handle_comment(self, data):
+        self.out.append(f"<!--{data}-->")
+
+    def handle_decl(self, decl):
+        self.out.append(f"<!{decl}>")
+
+    def unknown_decl(self, data):
+        self.out.append(f"<![{data}]>")
+
+    def handle_pi(self, data):
+        self.out.append(f"<?{data}>")
+
+    def result(self):
+        seen, items = set(self.source_urls), []
+        for href, label in self.moved:
+            if href in seen: continue
+            seen.add(href)
+            items.append(f'<li><a href="{html.escape(href)}">{html.escape(" ".join(label.split()) or href, quote=False)}</a></li>')
+        if items and self.sources_end is not None:
+            self.out.insert(self.sources_end, "".join(items))
+        elif items:
+            self.out.append(f"<h2>Sources</h2><ul>{''.join(items)}</ul>")
+        if self.words > MIN_WORDS_FOR_HEADINGS and not self.h2:
+            self.issues.append("No H2 section headings; the post needs structure.")
+        return "".join(self.out)
+
+def lint_html(body):
+    """Returns (fixed_html, fixes Counter, unfixable issues)."""
+    p = _Linter()
+    p.feed(DASH_ENTITY.sub("—", body or ""))
+    p.close()
+    return p.result(), p.fixes, p.issues
+
+def lint_post(post):
+    """Fixes a post dict in place of a refine call; returns (post, {"fixed": {...}, "issues": [...]})."""
+    body, fixes, issues = lint_html(post.get("html_content"))
+    out = {**post, "html_content": body}
+    for key in ("title", "excerpt", "meta_title", "meta_description"):
+        if post.get(key): out[key] = fix_text(post[key], fixes).strip()
+    return out, {"fixed": {k: v for k, v in fixes.items() if v}, "issues": issues}
@@ -0,0 +1,45 @@
+"""
+Splits a post into its H2/H3 sections and guesses which ones a piece of feedback is about.
+
+Section 0 is whatever precedes the first H2/H3, usually the intro. Feedback is matched on whole
+words only, so "trending" is not "ending" and "introduce" is not "intro"; anything unmatched is
+left to the model router (or treated as post-wide).
+"""
+import re
+
+SECTION_SPLIT = re.compile(r'(?=<h[23][\s>])', re.I)
+HEADING = re.compile(r'\s*<h([23])[^>]*>(.*?)</h\1>', re.I | re.S)
+INTRO_WORDS = ("intro", "introduction", "opening", "hook", "first paragraph", "lede")
+OUTRO_WORDS = ("conclusion", "ending", "outro", "wrap", "closing", "last paragraph", "call to action", "cta")
+TRAILING = ("sources", "references")
+
+def mentions(text, phrase):
+    return re.search(rf"\b{re.escape(phrase)}\b", text) is not None
+
+def split_sections(body):
+    return [part for part in SECTION_SPLIT.split(body) if part.strip()]
+
+def section_title(part):
+    m = HEADING.match(part)
+    return re.sub(r'<[^>]+>', '', m.group(2)).strip() if m else "Introduction"
+
+def section_outline(sections):
+    lines = []
+    for i, part in enumerate(sections):
+        m = HEADING.match(part)
+        indent = "  " if m and m.group(1) == "3" else ""
+        words = len(re.sub(r'<[^>]+>', ' ', part).split())
+        lines.append(f"[{i}] {indent}{section_title(part)} ({words} words)")
+    return "\n".join(lines)
+
+def guess_sections(sections, feedback):
+    """Cheap local pass: "intro", "conclusion" or a heading named in the feedback."""
+    fb, picks = feedback.lower(), set()
+    if any(mentions(fb, w) for w in INTRO_WORDS): picks.add(0)
+    if any(mentions(fb, w) for w in OUTRO_WORDS):
+        body = [i for i, part in enumerate(sections) if section_title(part).lower() not in TRAILING]
+        picks.add(body[-1] if body else len(sections) - 1)
+    for i, part in enumerate(sections):
+        title = section_title(part).lower()
+        if len(title) > 3 and mentions(fb, title): picks.add(i)
+    return sorted(picks)
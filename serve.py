@@ -0,0 +1,127 @@
+"""
+Procfile entry point. Runs several Streamlit worker processes behind a small sticky proxy on $PORT.
+
+Streamlit keeps each browser session (websocket, file uploads) inside one process, so the proxy
+pins a browser to a worker with a cookie it sets on the first response. Everything shared
+(research cache, job table, cost ledger) lives in the SQLite store under SHARP_BLOG_DATA, so
+any worker can pick up queued jobs.
+
+    SHARP_BLOG_WORKERS   worker processes (defaults to WEB_CONCURRENCY, then 2; 1 = plain streamlit)
+"""
+import asyncio
+import itertools
+import os
+import re
+import secrets
+import signal
+import subprocess
+import sys
+import time
+
+PORT = int(os.environ.get("PORT", "8501"))
+WORKERS = int(os.environ.get("SHARP_BLOG_WORKERS") or os.environ.get("WEB_CONCURRENCY") or 2)
+BASE_PORT = int(os.environ.get("SHARP_BLOG_WORKER_BASE_PORT", "8600"))
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sharp-blog.py")
+COOKIE = "sharp_worker"
+COOKIE_RE = re.compile(rb"(?:^|;\s*)" + COOKIE.encode() + rb"=(\d+)")
+MAX_HEAD = 64 * 1024
+
+def streamlit_cmd(port, address):
+    return [sys.executable, "-m", "streamlit", "run", APP, f"--server.port={port}", f"--server.address={address}",
+            "--server.headless=true"]
+
+# --- WORKERS ---
+class Workers:
+    def __init__(self, count):
+        # One cookie secret for all workers so XSRF tokens stay valid wherever a session lands
+        self.env = {**os.environ, "SHARP_BLOG_WORKERS": str(count),
+                    "STREAMLIT_SERVER_COOKIE_SECRET": os.environ.get("STREAMLIT_SERVER_COOKIE_SECRET") or secrets.token_hex(32)}
+        self.ports = [BASE_PORT + i for i in range(count)]
+        self.procs = [self._spawn(p) for p in self.ports]
+
+    def _spawn(self, port):
+        return subprocess.Popen(streamlit_cmd(port, "127.0.0.1"), env=self.env)
+
+    async def supervise(self):
+        while True:
+            await asyncio.sleep(2)
+            for i, proc in enumerate(self.procs):
+                if proc.poll() is not None:
+                    print(f"worker on :{self.ports[i]} exited ({proc.returncode}), restarting", flush=True)
+                    self.procs[i] = self._spawn(self.ports[i])
+
+    def stop(self):
+        for proc in self.procs: proc.terminate()
+        deadline = time.time() + 10
+        for proc in self.procs:
+            try: proc.wait(max(0, deadline - time.time()))
+            except subprocess.TimeoutExpired: proc.kill()
+
+# --- STICKY PROXY ---
+async def pipe(reader, writer):
+    try:
+        while data := await reader.read(64 * 1024):
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        try: writer.close()
+        except Exception: pass
+
+async def read_head(reader):
+    try: return await reader.readuntil(b"\r\n\r\n")
+    except asyncio.LimitOverrunError: return None
+    except asyncio.IncompleteReadError as e: return e.partial or None
+
+def pick_worker(head, count, rr):
+    cookie = next((line for line in head.split(b"\r\n") if line.lower().startswith(b"cookie:")), b"")
+    m = COOKIE_RE.search(cookie[7:].strip())
+    if m and int(m.group(1)) < count: return int(m.group(1)), False
+    return next(rr) % count, True
+
+async def handle(client_reader, client_writer, ports, rr):
+    head = await read_head(client_reader)
+    if not head:
+        client_writer.close()
+        return
+    idx, new_client = pick_worker(head, len(ports), rr)
+    try:
+        backend_reader, backend_writer = await asyncio.open_connection("127.0.0.1", ports[idx], limit=MAX_HEAD)
+    except OSError:
+        client_writer.write(b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        await client_writer.drain()
+        client_writer.close()
+        return
+    backend_writer.write(head)
+    upstream = asyncio.create_task(pipe(client_reader, backend_writer))
+
+    if new_client:
+        # Pin the browser: add our cookie to the first response on this connection
+        resp = await read_head(backend_reader)
+        if resp and resp.endswith(b"\r\n\r\n"):
+            cookie = f"Set-Cookie: {COOKIE}={idx}; Path=/; HttpOnly; SameSite=Lax\r\n".encode()
+            resp = resp[:-2] + cookie + b"\r\n"
+        if resp: client_writer.write(resp)
+    await pipe(backend_reader, client_writer)
+    upstream.cancel()
+
+async def main():
+    workers = Workers(WORKERS)
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT): loop.add_signal_handler(sig, stop.set)
+
+    rr = itertools.count()
+    server = await asyncio.start_server(lambda r, w: handle(r, w, workers.ports, rr), "0.0.0.0", PORT, limit=MAX_HEAD)
+    print(f"proxy on :{PORT} -> {len(workers.ports)} workers {workers.ports}", flush=True)
+    supervisor = asyncio.create_task(workers.supervise())
+    await stop.wait()
+    supervisor.cancel()
+    server.close()
+    workers.stop()
+
+if __name__ == "__main__":
+    if WORKERS <= 1:
+        os.execv(sys.executable, streamlit_cmd(PORT, "0.0.0.0"))
+    asyncio.run(main())
@@ -1,25 +1,55 @@
+import time
+SCRIPT_START = time.perf_counter()  # see PROFILING
 import streamlit as st
 import streamlit.components.v1 as components
 import requests
 import jwt
 import datetime
+import email.utils
 import json
 import io
 import urllib.parse
 import base64
+import csv
+import difflib
+import fcntl
+import hashlib
+import importlib
+import importlib.util
+import html
+import math
 import random
-from anthropic import Anthropic
-from pypdf import PdfReader
-from docx import Document
-from openai import OpenAI
+import re
+import sqlite3
+import sys
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from collections import Counter, deque
+from contextlib import closing
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import os
+import uuid
+import zlib
+import audio_split
+import doc_extract
+import ghost_publish
+import image_store
+import model_json
+import post_lint
+import post_sections
 
 # --- SAFE IMPORT FOR TEXTSTAT ---
+# Only checked here: textstat loads its hyphenation dictionaries, so it is imported on first use
+textstat_installed = importlib.util.find_spec("textstat") is not None
+
+# --- SAFE IMPORT FOR STREAMING UPLOADS ---
 try:
-    import textstat
-    textstat_installed = True
+    from requests_toolbelt import MultipartEncoder
 except ImportError:
-    textstat_installed = False
+    MultipartEncoder = None
+
+IMPORT_SECONDS = time.perf_counter() - SCRIPT_START
 
 # --- CONFIGURATION & NEON THEME ---
 st.set_page_config(page_title="Elite AI Blog Agent v0.14.6", page_icon="🧠", layout="wide")
@@ -86,6 +116,16 @@ if 'seo_keywords' not in st.session_state: st.session_state.seo_keywords = ""
 if 'last_claude_model' not in st.session_state: st.session_state.last_claude_model = "claude-sonnet-4-20250514"
 if 'claude_model_selection' not in st.session_state: st.session_state.claude_model_selection = "claude-sonnet-4-20250514"
 if 'headline_ideas' not in st.session_state: st.session_state.headline_ideas = ""
+if 'cache_stats' not in st.session_state: st.session_state.cache_stats = {"hits": 0, "misses": 0, "saved": 0.0}
+if 'telemetry' not in st.session_state: st.session_state.telemetry = []
+if 'image_history' not in st.session_state: st.session_state.image_history = []
+if 'variants' not in st.session_state: st.session_state.variants = []
+# The editor id rides in the URL so a reload (possibly landing on another worker) keeps its own jobs
+if 'editor_id' not in st.session_state: st.session_state.editor_id = st.query_params.get("editor") or uuid.uuid4().hex[:12]
+if 'active_job' not in st.session_state: st.session_state.active_job = st.query_params.get("job")
+if 'draft_id' not in st.session_state: st.session_state.draft_id = st.query_params.get("draft")
+if 'draft_digest' not in st.session_state: st.session_state.draft_digest = None
+st.query_params["editor"] = st.session_state.editor_id
 
 # --- SECRETS ---
 try:
@@ -98,106 +138,466 @@ except KeyError as e:
     st.error(f"❌ Missing Secret: {e}. Please set all keys.")
     st.stop()
 
+@st.cache_resource
+def job_local():
+    # Shared across reruns so background workers and fresh script runs see the same thread-local
+    return threading.local()
+
+JOB_LOCAL = job_local()
+
+def current_job():
+    return getattr(JOB_LOCAL, "job", None)
+
+# Inside a background job, logs/costs go to the job record instead of session_state
 def add_log(message):
     timestamp = datetime.datetime.now().strftime('%H:%M:%S')
-    st.session_state.log_events.insert(0, f"[{timestamp}] {message}")
+    job = current_job()
+    if job: job.log(f"[{timestamp}] {message}")
+    else: st.session_state.log_events.insert(0, f"[{timestamp}] {message}")
+
+_cost_lock = threading.Lock()
 
 def track_cost(provider, amount):
-    st.session_state.costs[provider] += amount
+    job = current_job()
+    with (job.lock if job else _cost_lock):
+        costs = job.costs["costs"] if job else st.session_state.costs
+        costs[provider] += amount
+
+def track_cache(hit, provider=None, amount=0.0):
+    job = current_job()
+    with (job.lock if job else _cost_lock):
+        stats = job.costs["cache"] if job else st.session_state.cache_stats
+        stats["hits" if hit else "misses"] += 1
+        if hit: stats["saved"] += amount
+
+# --- PROFILING ---
+# Heavy SDKs and parsers are imported where they are first used. Only the first script run in a
+# process pays real import time (later reruns hit sys.modules), so that figure is kept per process.
+RERUN_SAMPLES = 50
+
+@st.cache_resource
+def process_profile():
+    return {"cold_import": IMPORT_SECONDS, "lazy": {}, "reruns": deque(maxlen=RERUN_SAMPLES), "lock": threading.Lock()}
+
+PROFILE = process_profile()
+
+def lazy_import(name):
+    # Always go through import_module: it holds the per-module import lock, whereas sys.modules
+    # already lists a module another thread is still executing
+    cold = name not in sys.modules
+    t0 = time.perf_counter()
+    mod = importlib.import_module(name)
+    if cold:
+        with PROFILE["lock"]: PROFILE["lazy"].setdefault(name, time.perf_counter() - t0)
+    return mod
+
+# --- LOCAL STORE ---
+DATA_DIR = os.environ.get("SHARP_BLOG_DATA", ".sharp_blog")
+DB_PATH = os.path.join(DATA_DIR, "sharp_blog.db")
+CACHE_MAX_BYTES = int(os.environ.get("SHARP_BLOG_CACHE_MB", "64")) * 1024 * 1024
+
+MIGRATIONS = [
+    "ALTER TABLE llm_cache ADD COLUMN cost REAL NOT NULL DEFAULT 0",
+    "ALTER TABLE jobs ADD COLUMN worker TEXT",
+    "ALTER TABLE jobs ADD COLUMN partial TEXT",
+]
+
+def db():
+    conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+@st.cache_resource
+def init_db():
+    os.makedirs(DATA_DIR, exist_ok=True)
+    with closing(db()) as c:
+        c.executescript("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,
+                expires REAL NOT NULL, accessed REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache(accessed);
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY, owner TEXT NOT NULL, status TEXT NOT NULL, stage TEXT NOT NULL,
+                params TEXT NOT NULL, outputs TEXT NOT NULL, log TEXT NOT NULL, costs TEXT NOT NULL,
+                error TEXT, created REAL NOT NULL, updated REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS calls (
+                ts REAL, run TEXT, provider TEXT, model TEXT, agent TEXT, input_tokens INTEGER, output_tokens INTEGER,
+                cache_read_tokens INTEGER, cache_write_tokens INTEGER, images INTEGER, minutes REAL,
+                cost REAL, seconds REAL, attempts INTEGER);
+            CREATE INDEX IF NOT EXISTS calls_ts ON calls(ts);
+            CREATE TABLE IF NOT EXISTS drafts (
+                id TEXT PRIMARY KEY, owner TEXT NOT NULL, title TEXT, created REAL NOT NULL, updated REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS drafts_owner ON drafts(owner, updated);
+            CREATE TABLE IF NOT EXISTS revisions (
+                draft_id TEXT NOT NULL, rev INTEGER NOT NULL, kind TEXT NOT NULL, title TEXT, digest TEXT NOT NULL,
+                base INTEGER, size INTEGER NOT NULL, blob BLOB NOT NULL, created REAL NOT NULL,
+                PRIMARY KEY (draft_id, rev));
+        """)
+        for stmt in MIGRATIONS:
+            try: c.execute(stmt)
+            except sqlite3.OperationalError: pass  # already applied
+    return DB_PATH
+
+init_db()
+
+def cache_key(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+def cache_get(key):
+    now = time.time()
+    with closing(db()) as c:
+        row = c.execute("SELECT value, expires, cost FROM llm_cache WHERE key=?", (key,)).fetchone()
+        if not row: return None
+        if row[1] < now:
+            c.execute("DELETE FROM llm_cache WHERE key=?", (key,))
+            return None
+        c.execute("UPDATE llm_cache SET accessed=? WHERE key=?", (now, key))
+        return row[0], row[2]
+
+def cache_put(key, value, ttl, cost=0.0):
+    # cost is what the original call paid, credited as "saved" on every hit
+    now = time.time()
+    with closing(db()) as c:
+        c.execute("INSERT OR REPLACE INTO llm_cache (key, value, size, expires, accessed, cost) VALUES (?, ?, ?, ?, ?, ?)",
+                  (key, value, len(value.encode()), now + ttl, now, cost))
+        c.execute("DELETE FROM llm_cache WHERE expires < ?", (now,))
+        total = c.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= CACHE_MAX_BYTES: return
+        # LRU eviction down to 90% of the cap
+        for old_key, size in c.execute("SELECT key, size FROM llm_cache ORDER BY accessed").fetchall():
+            if total <= CACHE_MAX_BYTES * 0.9: break
+            c.execute("DELETE FROM llm_cache WHERE key=?", (old_key,))
+            total -= size
 
 # --- CLIENTS ---
 @st.cache_resource
 def get_clients():
-    pplx = OpenAI(api_key=PPLX_API_KEY, base_url="https://api.perplexity.ai")
-    anth = Anthropic(api_key=ANTHROPIC_API_KEY)
-    try: oai = OpenAI(api_key=OPENAI_API_KEY)
+    # SDK retries are off: call_provider owns backoff so limits are shared across all callers
+    openai, anthropic = lazy_import("openai"), lazy_import("anthropic")
+    pplx = openai.OpenAI(api_key=PPLX_API_KEY, base_url=os.environ.get("PERPLEXITY_BASE_URL", "https://api.perplexity.ai"), max_retries=0)
+    anth = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY, max_retries=0)
+    try: oai = openai.OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
     except: oai = None
     return pplx, anth, oai
 
-researcher, writer, openai_client = get_clients()
-openai_client_is_valid = openai_client is not None
+class LazyClient:
+    # Builds the SDK clients (and imports the SDKs) on the first API call, not on first page render
+    def __init__(self, index): self.index = index
+    def __getattr__(self, name): return getattr(get_clients()[self.index], name)
 
-# --- CUSTOM CELEBRATION ENGINE ---
-def celebrate_with_logos():
+researcher, writer, openai_client = LazyClient(0), LazyClient(1), LazyClient(2)
+
+HTTP_TIMEOUT = (5, 60)  # connect, read
+SDK_TIMEOUT = 600.0     # the provider SDKs' own default, cut short by a stage deadline
+
+@st.cache_resource
+def get_http():
+    # Keep-alive pool for Ghost and image CDN traffic, reused across reruns and jobs
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+openai_client_is_valid = bool(OPENAI_API_KEY)
+
+# --- CONCURRENCY ---
+def ctx_executor(max_workers):
+    # Worker threads inherit the script context (or the running job) so add_log/track_cost land in the right place
+    job, deadline = current_job(), getattr(JOB_LOCAL, "deadline", None)
+    ctx = None if job else get_script_run_ctx()
+    def init():
+        JOB_LOCAL.job, JOB_LOCAL.deadline = job, deadline
+        if ctx: add_script_run_ctx(threading.current_thread(), ctx)
+    return ThreadPoolExecutor(max_workers=max_workers, initializer=init)
+
+def time_left(default=None):
     """
-    Floats the specific Sharp Human logo files up the screen.
+    Seconds until this thread's run_parallel deadline, capped at default; default when there is
+    none. Raises TimeoutError once it has passed, so abandoned work stops calling providers.
     """
-    
-    # 1. UPDATED LOGO LIST
-    logo_files = [
-        "logo1-1.png", "logo1-2.png", "logo1-3.png", 
-        "logo1-4.png", "logo1-5.png", "logo1-6.png"
-    ]
-    
-    # 2. Helper to load image as Base64
-    def get_img_tag(filename):
-        if os.path.exists(filename):
-            with open(filename, "rb") as f:
-                data = f.read()
-                b64 = base64.b64encode(data).decode()
-                # Added filter: drop-shadow for neon effect
-                return f'<img src="data:image/png;base64,{b64}" style="width: 80px; opacity: 0.95; filter: drop-shadow(0 0 5px rgba(0,229,255,0.5));">'
-        return None
+    deadline = getattr(JOB_LOCAL, "deadline", None)
+    if deadline is None: return default
+    left = deadline - time.perf_counter()
+    if left <= 0: raise TimeoutError("stage deadline passed")
+    return left if default is None else min(default, left)
 
-    # 3. Generate Particles
-    particles = []
-    
-    for _ in range(50): # Number of logos
-        left = random.randint(0, 95)
-        delay = random.uniform(0, 3)
-        duration = random.uniform(4, 8)
-        
-        chosen_file = random.choice(logo_files)
-        img_tag = get_img_tag(chosen_file)
-        
-        if not img_tag:
-            # Fallback if file missing: Neon Square
-            color = random.choice(["#00e5ff", "#39ff14", "#d500f9"])
-            content = f'<div style="width: 20px; height: 20px; background-color: {color}; transform: rotate(45deg); box-shadow: 0 0 10px {color};"></div>'
-        else:
-            content = img_tag
-
-        particle_html = f"""
-        <div style="position: fixed; left: {left}%; bottom: -100px; 
-                    animation: floatUp {duration}s ease-in {delay}s forwards; 
-                    z-index: 9999; pointer-events: none;">
-            {content}
-        </div>
-        """
-        particles.append(particle_html)
+def run_parallel(tasks, label="Stage"):
+    """
+    Fans out independent agents. tasks = {name: (fn, timeout_s, fallback)}.
+    Returns {name: result}; a task that raises or overruns its timeout yields its fallback.
+    Each task runs under its deadline (nested inside any outer one): an overrun task is not
+    waited for, and its provider calls and streams stop at the next time_left() check.
+    """
+    timings = {}
+    def timed(name, fn, deadline):
+        JOB_LOCAL.deadline = deadline
+        t0 = time.perf_counter()
+        try: return fn()
+        finally: timings[name] = time.perf_counter() - t0
+
+    results = {}
+    start = time.perf_counter()
+    outer = getattr(JOB_LOCAL, "deadline", None)
+    deadlines = {name: start + t if outer is None else min(outer, start + t) for name, (_, t, _) in tasks.items()}
+    ex = ctx_executor(len(tasks))
+    futures = {name: ex.submit(timed, name, fn, deadlines[name]) for name, (fn, _, _) in tasks.items()}
+    for name, fut in futures.items():
+        _, timeout, fallback = tasks[name]
+        try:
+            results[name] = fut.result(timeout=max(0, deadlines[name] - time.perf_counter()))
+            add_log(f"⏱ {name}: {timings[name]:.1f}s")
+        except FutureTimeout:
+            results[name] = fallback
+            add_log(f"⏱ {name}: timed out after {timeout}s")
+        except Exception as e:
+            results[name] = fallback
+            add_log(f"⏱ {name}: failed ({e})")
+    ex.shutdown(wait=False, cancel_futures=True)
+    add_log(f"⏱ {label}: {time.perf_counter() - start:.1f}s wall vs {sum(dict(timings).values()):.1f}s serial")  # overrun tasks may still be writing
+    return results
+
+# --- TELEMETRY ---
+# USD per million tokens (plus per-request, per-image and per-minute fees where the provider charges them)
+PRICES = {
+    "claude-sonnet-4-20250514": {"in": 3.0, "out": 15.0},
+    "claude-3-5-sonnet": {"in": 3.0, "out": 15.0},
+    "claude-3-opus": {"in": 15.0, "out": 75.0},
+    "claude-3-5-haiku-20241022": {"in": 0.8, "out": 4.0},
+    "sonar": {"in": 1.0, "out": 1.0, "request": 0.005},
+    "sonar-pro": {"in": 3.0, "out": 15.0, "request": 0.006},
+    "dall-e-3": {"image": 0.08},   # standard quality, 1792x1024
+    "whisper-1": {"minute": 0.006},
+}
+TELEMETRY_FIELDS = ["ts", "run", "provider", "model", "agent", "input_tokens", "output_tokens", "cache_read_tokens",
+                    "cache_write_tokens", "images", "minutes", "cost", "seconds", "attempts"]
+LEDGER_EXPORT_ROWS = int(os.environ.get("SHARP_BLOG_EXPORT_ROWS", "10000"))
+
+def usage_of(res):
+    u = getattr(res, "usage", None)
+    data = getattr(res, "data", None)
+    return {
+        "input_tokens": (getattr(u, "input_tokens", None) or getattr(u, "prompt_tokens", None) or 0) if u else 0,
+        "output_tokens": (getattr(u, "output_tokens", None) or getattr(u, "completion_tokens", None) or 0) if u else 0,
+        "cache_read_tokens": (getattr(u, "cache_read_input_tokens", None) or 0) if u else 0,
+        "cache_write_tokens": (getattr(u, "cache_creation_input_tokens", None) or 0) if u else 0,
+        "images": len(data) if isinstance(data, list) else 0,
+        "minutes": (getattr(res, "duration", None) or 0) / 60,
+    }
+
+def price_call(model, usage):
+    p = PRICES.get(model, {})
+    # Anthropic bills cache writes at 1.25x and cache reads at 0.1x the input rate
+    tokens = (usage["input_tokens"] * p.get("in", 0) + usage["output_tokens"] * p.get("out", 0)
+              + usage["cache_write_tokens"] * p.get("in", 0) * 1.25 + usage["cache_read_tokens"] * p.get("in", 0) * 0.1)
+    return tokens / 1e6 + p.get("request", 0) + usage["images"] * p.get("image", 0) + usage["minutes"] * p.get("minute", 0)
+
+def record_call(provider, model, agent, res, seconds, attempts):
+    job = current_job()
+    rec = {"ts": round(time.time(), 3), "run": job.id if job else "interactive", "provider": provider, "model": model,
+           "agent": agent, **usage_of(res), "seconds": round(seconds, 3), "attempts": attempts}
+    rec["cost"] = round(price_call(model, rec), 6)
+    track_cost(provider, rec["cost"])
+    with (job.lock if job else _cost_lock):
+        (job.costs.setdefault("calls", []) if job else st.session_state.telemetry).append(rec)
+    # The shared ledger lives in SQLite so every worker process appends to the same place
+    with closing(db()) as c:
+        c.execute(f"INSERT INTO calls ({', '.join(TELEMETRY_FIELDS)}) VALUES ({', '.join('?' * len(TELEMETRY_FIELDS))})",
+                  [rec[k] for k in TELEMETRY_FIELDS])
+    return rec
+
+def summarize_calls(calls):
+    rows = {}
+    for c in calls:
+        r = rows.setdefault(c["agent"], {"agent": c["agent"], "calls": 0, "input_tokens": 0, "output_tokens": 0, "cost": 0.0, "seconds": 0.0})
+        r["calls"] += 1
+        for k in ("input_tokens", "output_tokens", "cost", "seconds"): r[k] += c[k]
+    return sorted(rows.values(), key=lambda r: -r["cost"])
+
+def ledger_rows(limit=LEDGER_EXPORT_ROWS):
+    # Newest calls only, oldest first; the ts index keeps this bounded however long the ledger grows
+    with closing(db()) as c:
+        rows = c.execute(f"SELECT {', '.join(TELEMETRY_FIELDS)} FROM calls ORDER BY ts DESC LIMIT ?", (limit,)).fetchall()
+    return [dict(zip(TELEMETRY_FIELDS, r)) for r in reversed(rows)]
+
+def ledger_version():
+    with closing(db()) as c:
+        return c.execute("SELECT MAX(rowid) FROM calls").fetchone()[0]
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def ledger_totals(version):
+    # Keyed on the newest rowid, so reruns reuse the aggregate until any worker logs a call
+    with closing(db()) as c:
+        rows = c.execute("SELECT agent, COUNT(*), SUM(input_tokens), SUM(output_tokens), SUM(cost), SUM(seconds) "
+                         "FROM calls GROUP BY agent ORDER BY SUM(cost) DESC").fetchall()
+    return [dict(zip(("agent", "calls", "input_tokens", "output_tokens", "cost", "seconds"), r)) for r in rows]
+
+def telemetry_jsonl():
+    return "".join(json.dumps(r) + "\n" for r in ledger_rows())
+
+def telemetry_csv():
+    out = io.StringIO()
+    w = csv.DictWriter(out, fieldnames=TELEMETRY_FIELDS)
+    w.writeheader()
+    w.writerows(ledger_rows())
+    return out.getvalue()
+
+# --- RATE LIMITS & RETRIES ---
+# (max concurrent calls, requests per minute) per provider for the whole deployment, overridable
+# with SHARP_BLOG_CONCURRENCY_<PROVIDER> and SHARP_BLOG_RPM_<PROVIDER>. serve.py tells each worker
+# process how many siblings it has so the budget is split between them.
+WORKER_PROCESSES = int(os.environ.get("SHARP_BLOG_WORKERS", "1"))
+PROVIDER_LIMITS = {
+    p: (max(1, int(os.environ.get(f"SHARP_BLOG_CONCURRENCY_{p.upper()}", conc)) // WORKER_PROCESSES),
+        max(1, int(os.environ.get(f"SHARP_BLOG_RPM_{p.upper()}", rpm)) // WORKER_PROCESSES))
+    for p, (conc, rpm) in {"Perplexity": (4, 50), "Anthropic": (3, 50), "OpenAI": (2, 20)}.items()
+}
+MAX_RETRIES = 5
+BACKOFF_BASE, BACKOFF_CAP = 1.0, 60.0
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, per_minute / 6.0)  # allow ~10s worth of burst
+        self.tokens, self.stamp = self.capacity, time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def drain(self):
+        # A 429 means the provider disagrees with our budget: stop the burst for everyone
+        with self.lock: self.tokens = min(self.tokens, 0.0)
+
+@st.cache_resource
+def provider_limiters():
+    return {p: (threading.BoundedSemaphore(conc), TokenBucket(rpm)) for p, (conc, rpm) in PROVIDER_LIMITS.items()}
+
+def retry_delay(e, attempt):
+    status = getattr(e, "status_code", None)
+    connection_error = any(c.__name__ == "APIConnectionError" for c in type(e).__mro__)
+    if status not in RETRY_STATUS and not connection_error: return None
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))  # full jitter
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try: delay = max(delay, float(retry_after))
+        except ValueError:
+            try: delay = max(delay, (email.utils.parsedate_to_datetime(retry_after) - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+            except (TypeError, ValueError): pass
+    return min(delay, BACKOFF_CAP)
+
+def call_provider(provider, fn, model, agent):
+    """
+    Runs fn() under the provider's concurrency cap and token bucket, retrying 429/5xx/529 and
+    connection errors with jittered exponential backoff (Retry-After wins when it is longer).
+    The successful response is metered: tokens, priced cost and wall time including retries.
+    """
+    slots, bucket = provider_limiters()[provider]
+    start = time.perf_counter()
+    for attempt in range(MAX_RETRIES + 1):
+        time_left()
+        bucket.acquire()
+        with slots:
+            try:
+                res = fn()
+                record_call(provider, model, agent, res, time.perf_counter() - start, attempt + 1)
+                return res
+            except Exception as e:
+                delay = retry_delay(e, attempt)
+                # No point backing off past the stage deadline; the caller has already given up
+                if delay is None or attempt == MAX_RETRIES or time_left(delay) < delay: raise
+                if getattr(e, "status_code", None) == 429: bucket.drain()
+                reason = getattr(e, "status_code", None) or type(e).__name__
+        add_log(f"{provider} {reason}: retry {attempt + 1}/{MAX_RETRIES} in {delay:.1f}s")
+        time.sleep(delay)
+
+# --- CUSTOM CELEBRATION ENGINE ---
+LOGO_FILES = ["logo1-1.png", "logo1-2.png", "logo1-3.png", "logo1-4.png", "logo1-5.png", "logo1-6.png"]
+LOGO_WIDTH = 80
 
-    # 4. Inject CSS Animation
-    full_html = f"""
+@st.cache_resource
+def celebration_css():
+    """
+    Reads and encodes each logo once per process; particles pick a logo by CSS class, so the
+    page carries one copy of each image however many particles float up.
+    """
+    rules, classes = [], []
+    for i, filename in enumerate(LOGO_FILES):
+        if not os.path.exists(filename): continue
+        with open(filename, "rb") as f: data = f.read()
+        height = LOGO_WIDTH
+        if data[:8] == b"\x89PNG\r\n\x1a\n":
+            w, h = struct.unpack(">II", data[16:24])
+            if w: height = round(LOGO_WIDTH * h / w)
+        rules.append(f".sh-logo-{i} {{ width: {LOGO_WIDTH}px; height: {height}px; "
+                     f"background: url(data:image/png;base64,{base64.b64encode(data).decode()}) center / contain no-repeat; "
+                     f"opacity: 0.95; filter: drop-shadow(0 0 5px rgba(0,229,255,0.5)); }}")
+        classes.append(f"sh-logo-{i}")
+    # Fallback if files are missing: neon squares
+    for i, color in enumerate(["#00e5ff", "#39ff14", "#d500f9"]):
+        rules.append(f".sh-square-{i} {{ width: 20px; height: 20px; background-color: {color}; transform: rotate(45deg); box-shadow: 0 0 10px {color}; }}")
+    css = f"""
     <style>
         @keyframes floatUp {{
             0% {{ bottom: -120px; opacity: 0; transform: scale(0.5) rotate(0deg); }}
             10% {{ opacity: 1; }}
             100% {{ bottom: 120vh; opacity: 0; transform: scale(1.1) rotate(20deg); }}
         }}
-    </style>
-    {''.join(particles)}
+        .sh-particle {{ position: fixed; bottom: -100px; z-index: 9999; pointer-events: none;
+                        animation-name: floatUp; animation-timing-function: ease-in; animation-fill-mode: forwards; }}
+        {chr(10).join(rules)}
+    </style>"""
+    return css, classes or [f"sh-square-{i}" for i in range(3)]
+
+def celebrate_with_logos():
+    """
+    Floats the specific Sharp Human logo files up the screen.
     """
-    st.markdown(full_html, unsafe_allow_html=True)
+    css, classes = celebration_css()
+    particles = [
+        f'<div class="sh-particle" style="left: {random.randint(0, 95)}%; animation-duration: {random.uniform(4, 8):.2f}s; '
+        f'animation-delay: {random.uniform(0, 3):.2f}s;"><div class="{random.choice(classes)}"></div></div>'
+        for _ in range(50)  # Number of logos
+    ]
+    st.markdown(css + "".join(particles), unsafe_allow_html=True)
 
 # --- HELPERS ---
-def extract_text(file):
+CONTEXT_CHARS = 40000
+
+def extract_text(file, limit=CONTEXT_CHARS):
+    # Stops parsing as soon as the writer's character budget is filled
     try:
-        if file.name.endswith('.pdf'):
-            reader = PdfReader(file)
-            return "\n".join([p.extract_text() for p in reader.pages])
-        elif file.name.endswith('.docx'):
-            return "\n".join([p.text for p in Document(file).paragraphs])
-        elif file.name.endswith('.txt') or file.name.endswith('.md'):
-            return file.read().decode("utf-8")
-        return ""
+        parser = {".pdf": "pypdf", ".docx": "docx"}.get(os.path.splitext(file.name.lower())[1])
+        if parser: lazy_import(parser)  # first upload of its kind pays (and reports) the import
+        return doc_extract.extract_text(file, limit)
     except: return "Error reading file."
 
+TRANSCRIBE_WORKERS = 4
+
+def transcribe_segment(job):
+    name, data = job()
+    # verbose_json reports the billed duration, so metered cost follows the real length
+    res = call_provider("OpenAI", lambda: openai_client.audio.transcriptions.create(model="whisper-1", file=(name, data), response_format="verbose_json"), "whisper-1", "transcribe")
+    return res.text
+
 def transcribe_audio(file):
     if not openai_client_is_valid: return "OpenAI Key Missing."
     try:
-        transcript = openai_client.audio.transcriptions.create(model="whisper-1", file=file)
-        track_cost("OpenAI", 0.06)
-        return transcript.text
+        with audio_split.segment_jobs(file) as jobs:
+            if len(jobs) > 1: add_log(f"Transcribing {len(jobs)} segments...")
+            with ctx_executor(min(TRANSCRIBE_WORKERS, len(jobs))) as ex:
+                texts = list(ex.map(transcribe_segment, jobs))
+        return audio_split.stitch(texts)
     except Exception as e:
         if "413" in str(e): return "Error: File >25MB (OpenAI Limit)."
         return f"Error: {e}"
@@ -213,73 +613,181 @@ def generate_social_link(text, platform):
     return "#"
 
 # --- AGENTS ---
+RESEARCH_TTL = 24 * 3600
+IDEAS_TTL = 7 * 24 * 3600
+
+def cached_search(model, messages, ttl, agent):
+    key = cache_key("perplexity", model, messages)
+    hit = cache_get(key)
+    if hit is not None:
+        track_cache(True, "Perplexity", hit[1])
+        return hit[0]
+    res = call_provider("Perplexity", lambda: researcher.chat.completions.create(model=model, messages=messages, timeout=time_left(SDK_TIMEOUT)), model, agent)
+    track_cache(False)
+    text = res.choices[0].message.content
+    if text: cache_put(key, text, ttl, price_call(model, usage_of(res)))
+    return text
 
 def agent_headlines(topic):
     add_log("Generating Headlines...")
     try:
-        res = researcher.chat.completions.create(model="sonar", messages=[{"role": "user", "content": f"Generate 5 engaging, helpful blog headlines for the topic: '{topic}'. Do not use clickbait like 'Death of'. Be professional and inviting."}])
-        track_cost("Perplexity", 0.005)
-        return res.choices[0].message.content
+        return cached_search("sonar", [{"role": "user", "content": f"Generate 5 engaging, helpful blog headlines for the topic: '{topic}'. Do not use clickbait like 'Death of'. Be professional and inviting."}], IDEAS_TTL, "headlines")
     except: return "Error generating headlines."
 
 def agent_seo(topic):
     add_log("SEO: Analyzing...")
     try:
-        res = researcher.chat.completions.create(model="sonar", messages=[{"role": "user", "content": f"Suggest 5-7 high-impact SEO keywords for: {topic}. Comma separated."}])
-        track_cost("Perplexity", 0.005)
-        return res.choices[0].message.content
+        return cached_search("sonar", [{"role": "user", "content": f"Suggest 5-7 high-impact SEO keywords for: {topic}. Comma separated."}], IDEAS_TTL, "seo")
     except: return ""
 
 def agent_research(topic, context):
     add_log("Agent 1: Researching...")
     sys_prompt = "You are a Fact-Checking Researcher." if context else "You are an elite researcher."
     try:
-        res = researcher.chat.completions.create(model="sonar-pro", messages=[{"role": "system", "content": sys_prompt}, {"role": "user", "content": f"Research: {topic}"}])
-        track_cost("Perplexity", 0.02)
-        return res.choices[0].message.content
+        return cached_search("sonar-pro", [{"role": "system", "content": sys_prompt}, {"role": "user", "content": f"Research: {topic}"}], RESEARCH_TTL, "research")
     except: return None
 
-def clean_json_response(txt):
-    txt = txt.strip()
-    if "```json" in txt: txt = txt.split("```json")[1].split("```")[0]
-    elif "```" in txt: txt = txt.split("```")[1].split("```")[0]
-    return txt.strip()
+CLAUDE_MEMO_TTL = 3600
+CACHEABLE = {"type": "ephemeral"}
+OUTPUT_TOOL = "emit_json"
+MAX_CONTINUATIONS = 2
+CONTINUE_TAIL = 1500   # chars of the cut value quoted back so the model can pick up mid-sentence
+
+def string_schema(*keys):
+    return {"type": "object", "properties": {k: {"type": "string"} for k in keys}, "required": list(keys)}
+
+def subschema(schema, keys):
+    return {**schema, "properties": {k: schema["properties"][k] for k in keys}, "required": list(keys)}
+
+def output_tool(schema):
+    return {"tools": [{"name": OUTPUT_TOOL, "description": "Return the answer as structured JSON.", "input_schema": schema}],
+            "tool_choice": {"type": "tool", "name": OUTPUT_TOOL}}
+
+def claude_generate(kwargs, model, agent, on_text=None, schema=None):
+    """One uncached Claude call; returns (data, cut key or None, message)."""
+    raw = []
+    def stream_text():
+        text, last_push = "", 0.0
+        with writer.messages.stream(**kwargs, timeout=time_left(SDK_TIMEOUT)) as stream:
+            for event in stream:
+                time_left()   # leaving the with block closes the stream, so generation stops too
+                if event.type != "content_block_delta": continue
+                text += getattr(event.delta, "partial_json", None) or getattr(event.delta, "text", None) or ""
+                if time.perf_counter() - last_push > 0.25:
+                    last_push = time.perf_counter()
+                    on_text(text)
+            raw.append(text)
+            return stream.get_final_message()
 
-def agent_writer(topic, headline_hint, research, style, tone, keywords, audience, context_txt, model):
+    msg = call_provider("Anthropic", stream_text if on_text else lambda: writer.messages.create(**kwargs, timeout=time_left(SDK_TIMEOUT)), model, agent)
+    tool = next((b for b in msg.content if b.type == "tool_use"), None)
+    if raw: text = raw[0]   # the streamed JSON exactly as generated, possibly cut short
+    elif tool is not None: text = json.dumps(tool.input)
+    else: text = "".join(b.text for b in msg.content if b.type == "text")
+    try: data, cut = model_json.repair_json(text)
+    except ValueError:
+        if not schema: raise
+        data, cut = {}, None
+    if not raw and tool is not None and msg.stop_reason == "max_tokens" and data: cut = list(data)[-1]
+    return data, cut, msg
+
+def claude_json(model, content, max_tokens, temperature, agent, system=None, on_text=None, schema=None, fill_missing=True):
+    """
+    Shared path for every Claude call: exact-duplicate requests are answered from the local
+    cache, otherwise the call runs (streamed when on_text is given) and the parsed JSON is memoized.
+    With a schema the answer comes back as forced tool input. A string value cut off by
+    max_tokens is continued from where it stops; keys never reached are re-requested on their own.
+    """
+    kwargs = dict(model=model, max_tokens=max_tokens, temperature=temperature, messages=[{"role": "user", "content": content}])
+    if system: kwargs["system"] = system
+    if schema: kwargs.update(output_tool(schema))
+    key = cache_key("anthropic", kwargs)
+    hit = cache_get(key)
+    if hit is not None:
+        track_cache(True, "Anthropic", hit[1])
+        if on_text: on_text(hit[0])
+        return model_json.repair_json(hit[0])[0]
+
+    data, cut, msg = claude_generate(kwargs, model, agent, on_text, schema)
+    track_cache(False)
+    required = (schema or {}).get("required", [])
+    blocks = content if isinstance(content, list) else [{"type": "text", "text": content}]
+
+    for _ in range(MAX_CONTINUATIONS if fill_missing else 0):
+        if cut not in required or not isinstance(data.get(cut), str) or not data[cut]: break
+        add_log(f"⚠️ {agent}: {cut} cut off at {len(data[cut]):,} chars, continuing")
+        ask = (f"Your {cut} was cut off by the length limit. It ends with:\n{data[cut][-CONTINUE_TAIL:]}\n\n"
+               f"Return ONLY {cut}, holding just the text that comes next, starting exactly where it stops. Repeat nothing.")
+        more, more_cut, _ = claude_generate({**kwargs, **output_tool(subschema(schema, [cut])),
+                                             "messages": [{"role": "user", "content": blocks + [{"type": "text", "text": ask}]}]},
+                                            model, agent, schema=schema)
+        if not isinstance(more.get(cut), str) or not more[cut]: break
+        data[cut] += more[cut]
+        cut = cut if more_cut == cut else None
+
+    if cut in data and isinstance(data[cut], str):
+        add_log(f"⚠️ {agent}: {cut} still cut off after {MAX_CONTINUATIONS} continuations; keeping it")
+        cut = None
+    missing = [k for k in required if k not in data or k == cut]
+    if missing and fill_missing:
+        add_log(f"⚠️ {agent}: output incomplete, re-requesting {', '.join(missing)}")
+        have = {k: v for k, v in data.items() if k not in missing and len(json.dumps(v)) < 1000}
+        follow_up = blocks + [{"type": "text", "text": f"Already written: {json.dumps(have)}. Return ONLY these keys: {', '.join(missing)}."}]
+        data.update(claude_json(model, follow_up, max_tokens, temperature, agent, system, schema=subschema(schema, missing), fill_missing=False))
+    elif missing:
+        raise ValueError(f"missing keys: {', '.join(missing)}")
+    # Only memoize complete output, so a retry after a bad generation really retries
+    cache_put(key, json.dumps(data), CLAUDE_MEMO_TTL, price_call(model, usage_of(msg)))
+    return data
+
+POST_SCHEMA = string_schema("title", "meta_title", "meta_description", "excerpt", "html_content")  # long body last
+SOCIALS_SCHEMA = {"type": "object", "properties": {"linkedin": {"type": "string"}, "reddit": {"type": "string"},
+                                                   "twitter_thread": {"type": "array", "items": {"type": "string"}}},
+                  "required": ["linkedin", "reddit", "twitter_thread"]}
+
+WRITER_SYSTEM = """
+    You are a world-class Ghostwriter and Editor. Write a helpful, high-quality blog post.
+
+    *** 🚨 RULES OF ENGAGEMENT 🚨 ***
+    1. **PUNCTUATION:** **NEVER USE LONG HYPHENS (EM-DASHES —)**. Structure your sentences naturally so they aren't needed. Use commas or periods.
+    2. **BOLDING:** Do **NOT** use bold text inside paragraphs. Save bolding for Headers (H2/H3) only.
+    3. **PRIVACY:** Generalize all anecdotes. Use "Industry trends show..." instead of "Bob said...". Keep it industry-agnostic.
+    4. **NO INLINE LINKS:** Do not distract the reader. List sources at the bottom.
+    5. **HUMAN FLOW:** Write like a human. Varied sentence structure. Warm but professional.
+
+    **OUTPUT FORMAT:**
+    Return ONLY a valid JSON object with keys: "title", "meta_title", "meta_description", "excerpt", "html_content".
+    """
+
+def agent_writer(topic, headline_hint, research, style, tone, keywords, audience, context_txt, model, on_partial=None, temperature=0.7):
     add_log(f"Agent 2: Writing...")
     
     headline_inst = ""
     if headline_hint:
         headline_inst = f"MANDATORY HEADLINE: You MUST use this exact headline or a close variation: '{headline_hint}'"
 
-    prompt = f"""
-    You are a world-class Ghostwriter and Editor. Write a helpful, high-quality blog post.
-    
+    # Research + context file is the large, stable prefix: cached by Anthropic so retries
+    # with a different headline/tone/keywords only pay for the short strategy block.
+    sources = f"""
+    **DATA SOURCES:**
+    - RESEARCH: {research}
+    - CONTEXT FILE: {context_txt[:CONTEXT_CHARS] if context_txt else "None"}
+    """
+    strategy = f"""
     **STRATEGY:**
     - TOPIC: "{topic}"
     - {headline_inst}
     - AUDIENCE: {audience}
     - TONE: {tone}
     - KEYWORDS: {keywords}
-    
-    **DATA SOURCES:**
-    - RESEARCH: {research}
-    - CONTEXT FILE: {context_txt[:40000] if context_txt else "None"}
-
-    *** 🚨 RULES OF ENGAGEMENT 🚨 ***
-    1. **PUNCTUATION:** **NEVER USE LONG HYPHENS (EM-DASHES —)**. Structure your sentences naturally so they aren't needed. Use commas or periods.
-    2. **BOLDING:** Do **NOT** use bold text inside paragraphs. Save bolding for Headers (H2/H3) only.
-    3. **PRIVACY:** Generalize all anecdotes. Use "Industry trends show..." instead of "Bob said...". Keep it industry-agnostic.
-    4. **NO INLINE LINKS:** Do not distract the reader. List sources at the bottom.
-    5. **HUMAN FLOW:** Write like a human. Varied sentence structure. Warm but professional.
-    
-    **OUTPUT FORMAT:**
-    Return ONLY a valid JSON object with keys: "title", "meta_title", "meta_description", "excerpt", "html_content".
     """
+    on_text = None
+    if on_partial:
+        on_text = lambda text: on_partial(model_json.partial_field(text, "title"), model_json.partial_field(text, "html_content"))
     try:
-        msg = writer.messages.create(model=model, max_tokens=8000, temperature=0.7, messages=[{"role": "user", "content": prompt}])
-        track_cost("Anthropic", 0.03)
-        return json.loads(clean_json_response(msg.content[0].text))
+        return claude_json(model, [{"type": "text", "text": sources, "cache_control": CACHEABLE}, {"type": "text", "text": strategy}],
+                           8000, temperature, "writer", system=[{"type": "text", "text": WRITER_SYSTEM, "cache_control": CACHEABLE}], on_text=on_text,
+                           schema=POST_SCHEMA)
     except Exception as e:
         add_log(f"Writer Error: {e}")
         return None
@@ -298,10 +806,7 @@ def agent_socials(blog_html, model):
     IMPORTANT: Return ONLY valid JSON.
     OUTPUT: JSON with keys: "linkedin", "twitter_thread" (Array of strings), "reddit".
     """
-    try:
-        msg = writer.messages.create(model=model, max_tokens=2000, temperature=0.7, messages=[{"role": "user", "content": prompt}])
-        track_cost("Anthropic", 0.01)
-        return json.loads(clean_json_response(msg.content[0].text))
+    try: return claude_json(model, prompt, 2000, 0.7, "socials", schema=SOCIALS_SCHEMA)
     except: return {"linkedin": "", "twitter_thread": [], "reddit": ""}
 
 def agent_artist(topic, tone, audience, custom_prompt=None):
@@ -315,58 +820,705 @@ def agent_artist(topic, tone, audience, custom_prompt=None):
 
     full_prompt = f"{base_prompt}. Style: {visual_style}. No text. Aspect Ratio: 16:9."
     try:
-        res = openai_client.images.generate(model="dall-e-3", prompt=full_prompt, size="1024x1024", quality="standard", n=1)
-        track_cost("OpenAI", 0.04)
+        res = call_provider("OpenAI", lambda: openai_client.images.generate(model="dall-e-3", prompt=full_prompt, size="1792x1024", quality="standard", n=1, timeout=time_left(SDK_TIMEOUT)), "dall-e-3", "artist")
         return res.data[0].url
     except: return None
 
-def agent_refine(data, feedback, model):
-    add_log("Agent 5: Refining...")
-    prompt = f"""
+REFINE_SYSTEM = """
     Refine this blog post.
-    CURRENT DATA: {json.dumps(data)}
-    FEEDBACK: {feedback}
     RULES: Keep HTML format. No Emojis. No Em-dashes. No Bold in paragraphs.
     OUTPUT: JSON with keys title, meta_title, meta_description, excerpt, html_content.
     """
-    try:
-        msg = writer.messages.create(model=model, max_tokens=8000, temperature=0.4, messages=[{"role": "user", "content": prompt}])
-        track_cost("Anthropic", 0.02)
-        return json.loads(clean_json_response(msg.content[0].text))
+
+def agent_refine(data, feedback, model):
+    add_log("Agent 5: Refining...")
+    # No cache breakpoint: the post changes after every round, so it would only ever be written at
+    # the 1.25x rate, and the system prompt is below the cacheable minimum. The saving on repeated
+    # rounds comes from agent_refine_sections, which sends only the affected sections.
+    content = [
+        {"type": "text", "text": f"CURRENT DATA: {json.dumps(data)}"},
+        {"type": "text", "text": f"FEEDBACK: {feedback}"},
+    ]
+    try: return claude_json(model, content, 8000, 0.4, "refine", system=REFINE_SYSTEM, schema=POST_SCHEMA)
     except: return None
 
-def upload_ghost(data, img_url, tags):
-    add_log("Publishing to Ghost...")
+# --- CONTEXT DISTILLATION ---
+CONTEXT_SCAN_CHARS = 400_000  # how much of an upload is read and indexed
+BRIEF_CHARS = 12_000          # what the writer actually receives
+CHUNK_CHARS = 1_500
+SUMMARY_CHUNKS = 24
+SUMMARY_MODEL = "claude-3-5-haiku-20241022"
+STOPWORDS = frozenset("""the and for are but not you all any can had her was one our out has have this that with from
+    they will would there their what about which when your into more some than them then these been were also just
+    like over such only very really know think going yeah okay right""".split())
+
+def lexical_terms(text):
+    return [w for w in re.findall(r"[a-z0-9]+", text.lower()) if len(w) > 2 and w not in STOPWORDS]
+
+def chunk_text(text, size=CHUNK_CHARS):
+    # Paragraph-aware chunks; transcripts with no line breaks are cut on sentence ends
+    chunks, buf = [], ""
+    for para in re.split(r"\n+", text):
+        para = para.strip()
+        while len(para) > size:
+            cut = para.rfind(". ", 0, size)
+            cut = cut + 1 if cut > size // 2 else size
+            if buf: chunks, buf = chunks + [buf], ""
+            chunks.append(para[:cut])
+            para = para[cut:].strip()
+        if not para: continue
+        if buf and len(buf) + len(para) + 1 > size: chunks, buf = chunks + [buf], ""
+        buf = f"{buf}\n{para}" if buf else para
+    if buf: chunks.append(buf)
+    return chunks
+
+def bm25_rank(chunks, query, k1=1.5, b=0.75):
+    docs = [Counter(lexical_terms(c)) for c in chunks]
+    lengths = [sum(d.values()) for d in docs]
+    avg = (sum(lengths) / len(docs)) or 1
+    df = Counter(t for d in docs for t in d)
+    terms = set(lexical_terms(query))
+    def score(i):
+        d, total = docs[i], 0.0
+        for t in terms & d.keys():
+            idf = math.log(1 + (len(docs) - df[t] + 0.5) / (df[t] + 0.5))
+            total += idf * d[t] * (k1 + 1) / (d[t] + k1 * (1 - b + b * lengths[i] / avg))
+        return total
+    return sorted(range(len(docs)), key=lambda i: -score(i))
+
+DISTILL_SYSTEM = "Extract the facts, figures, quotes and arguments from the excerpt that are useful for a blog post on the topic. Reply with ONLY JSON: {\"notes\": [\"...\"]}. Return an empty list if nothing is relevant."
+
+def summarize_chunk(chunk, topic):
+    try:
+        notes = claude_json(SUMMARY_MODEL, f"TOPIC: {topic}\n\nEXCERPT:\n{chunk}", 600, 0.0, "distill", system=DISTILL_SYSTEM,
+                            schema={"type": "object", "properties": {"notes": {"type": "array", "items": {"type": "string"}}}, "required": ["notes"]}).get("notes") or []
+        return "\n".join(f"- {n}" for n in notes)
+    except Exception: return ""
+
+def distill_context(text, topic, keywords, headline, summarize=False):
+    """
+    Turns a long upload into a compact brief: BM25-rank chunks against the topic/keywords and
+    keep the best ones in document order, or (summarize=True) map the top chunks through a
+    cheap model concurrently and stitch the notes.
+    """
+    if not text or len(text) <= BRIEF_CHARS: return text
+    chunks = chunk_text(text)
+    ranked = bm25_rank(chunks, f"{topic} {keywords} {headline}")
+
+    if summarize:
+        top = sorted(ranked[:SUMMARY_CHUNKS])
+        with ctx_executor(4) as ex:
+            notes = [n for n in ex.map(lambda i: summarize_chunk(chunks[i], topic), top) if n]
+        brief = "\n".join(notes)
+        if brief:
+            add_log(f"Context summarized: {len(top)} of {len(chunks)} chunks -> {len(brief):,} chars.")
+            return brief[:BRIEF_CHARS]
+
+    picked, size = [], 0
+    for i in ranked:
+        if size + len(chunks[i]) > BRIEF_CHARS: break
+        picked.append(i)
+        size += len(chunks[i])
+    add_log(f"Context distilled: {len(picked)} of {len(chunks)} chunks, {size:,} of {len(text):,} chars.")
+    return "\n[...]\n".join(chunks[i] for i in sorted(picked))
+
+# --- TARGETED REFINE ---
+# Splitting and the local section guess live in post_sections; the model only routes what that misses
+PICK_SYSTEM = "You route blog edit requests. Reply with ONLY JSON: {\"sections\": [indexes]} listing the sections the feedback affects, or [] if it affects the whole post."
+
+TARGETED_SYSTEM = """
+    Rewrite only the blog post sections you are given, following the feedback.
+    RULES: Keep HTML format. Keep each section's heading unless the feedback asks to change it. No Emojis. No Em-dashes. No Bold in paragraphs.
+    OUTPUT: JSON {"sections": {"<index>": "<rewritten section html>"}} with exactly the indexes you were given.
+    """
+
+def agent_refine_sections(data, feedback, model, picks=None):
+    """
+    Refines only the affected H2/H3 sections and splices them back, so cost and latency follow
+    the size of the edit. Returns None when the edit is post-wide (caller falls back to agent_refine).
+    """
+    sections = post_sections.split_sections(data['html_content'])
+    outline = post_sections.section_outline(sections)
+    picks = [i for i in (picks or post_sections.guess_sections(sections, feedback)) if 0 <= i < len(sections)]
+    if not picks:
+        try:
+            routed = claude_json(model, f"OUTLINE:\n{outline}\n\nFEEDBACK: {feedback}", 100, 0.0, "refine_route", system=PICK_SYSTEM,
+                                 schema={"type": "object", "properties": {"sections": {"type": "array", "items": {"type": "integer"}}}, "required": ["sections"]})
+            picks = sorted({int(i) for i in routed.get("sections", []) if 0 <= int(i) < len(sections)})
+        except Exception: picks = []
+    if not picks or len(picks) == len(sections): return None
+
+    add_log(f"Agent 5: Refining sections {picks}...")
+    chosen = "\n\n".join(f"=== SECTION {i} ===\n{sections[i]}" for i in picks)
+    size = sum(len(sections[i]) for i in picks)
+    prompt = f"POST TITLE: {data['title']}\n\nOUTLINE:\n{outline}\n\n{chosen}\n\nFEEDBACK: {feedback}"
+    try:
+        out = claude_json(model, prompt, min(8000, size // 3 + 500), 0.4, "refine", system=TARGETED_SYSTEM,
+                          schema={"type": "object", "properties": {"sections": {"type": "object", "additionalProperties": {"type": "string"}}}, "required": ["sections"]})
+        for key, rewritten in (out.get("sections") or {}).items():
+            if int(key) in picks and rewritten.strip(): sections[int(key)] = rewritten
+    except Exception: return None
+    return {**data, 'html_content': "".join(sections)}
+
+# --- STYLE CHECK ---
+# The house rules are enforced locally by post_lint; only what needs rewriting goes back to a model
+READABILITY_FLOOR = 30
+
+def readability(html_content):
+    if not textstat_installed: return {}
+    textstat = lazy_import("textstat")
+    text = html.unescape(re.sub(r"<[^>]+>", " ", html_content or ""))
+    if len(text.split()) < 100: return {}
+    return {"ease": round(textstat.flesch_reading_ease(text), 1), "grade": round(textstat.flesch_kincaid_grade(text), 1),
+            "minutes": round(textstat.reading_time(text) / 60, 1)}
+
+def style_check(post):
+    fixed, report = post_lint.lint_post(post)
+    report["scores"] = readability(fixed.get("html_content"))
+    ease = report["scores"].get("ease")
+    if ease is not None and ease < READABILITY_FLOOR: report["issues"].append(f"Reading ease is {ease}; shorten sentences and words.")
+    return fixed, report
+
+def enforce_style(post):
+    # Every generated or refined draft passes through here before the editor sees it
+    if not post: return post
+    fixed, report = style_check(post)
+    if report["fixed"]: add_log("🧹 Fixed locally: " + ", ".join(f"{n} {k.replace('_', ' ')}" for k, n in report["fixed"].items()))
+    return fixed
+
+# --- DRAFT VARIANTS ---
+# One parallel round of drafts (one per suggested headline, else spread over temperatures),
+# ranked locally so the editor starts from the best angle instead of refining serially.
+MAX_VARIANTS = 4
+VARIANT_TIMEOUT = 300
+VARIANT_TEMPERATURES = (0.7, 0.9, 0.5, 1.0)
+
+def parse_headlines(text):
+    lines = re.findall(r'^\s*(?:\d+[.)]|[-*•])\s+(.+?)\s*$', text or "", re.M)
+    return [h for h in (re.sub(r'^[*"“]+|[*"”]+$', '', line).strip() for line in lines) if h]
+
+def variant_plan(n, headline_hint, headlines):
+    # (label, headline, temperature) per draft
+    if not headline_hint and len(headlines) >= 2: return [(h, h, 0.7) for h in headlines[:n]]
+    return [(f"temperature {t}", headline_hint, t) for t in VARIANT_TEMPERATURES[:n]]
+
+def keyword_coverage(text, keywords):
+    terms = [k.strip().lower() for k in (keywords or "").split(",") if k.strip()]
+    return sum(t in text.lower() for t in terms) / len(terms) if terms else None
+
+def score_draft(post, keywords):
+    # Scored before the style fixer runs, so rule breaks count against the draft that made them
+    fixed, report = style_check(post)
+    text = html.unescape(re.sub(r"<[^>]+>", " ", f"{post.get('title')} {post.get('html_content')}"))
+    coverage, ease = keyword_coverage(text, keywords), report["scores"].get("ease")
+    violations = sum(report["fixed"].values()) + len(report["issues"])
+    parts = [(coverage, 0.5), (None if ease is None else max(0.0, 1 - abs(ease - 60) / 60), 0.3), (max(0.0, 1 - violations / 10), 0.2)]
+    parts = [(v, w) for v, w in parts if v is not None]
+    score = sum(v * w for v, w in parts) / sum(w for _, w in parts)
+    return fixed, {"score": round(score, 3), "coverage": coverage, "ease": ease, "violations": violations}
+
+def write_variants(p, research, context, on_partial=None):
+    plan = variant_plan(min(p["variants"], MAX_VARIANTS), p["headline_hint"], p.get("headlines") or [])
+    # Drafts beyond this worker's Anthropic slots wait for one, so the deadline covers every wave
+    slots = PROVIDER_LIMITS["Anthropic"][0]
+    waves = math.ceil(len(plan) / slots)
+    if waves > 1: add_log(f"🧪 {len(plan)} variants share {slots} Anthropic slot(s): {waves} waves")
+    tasks = {f"draft {n + 1}": (lambda h=h, t=t, first=(n == 0): agent_writer(
+        p["topic"], h, research, p["style"], p["tone"], p["keywords"], p["audience"], context, p["model"],
+        on_partial=on_partial if first else None, temperature=t), VARIANT_TIMEOUT * waves, None) for n, (_, h, t) in enumerate(plan)}
+    ranked = []
+    for (label, _, t), draft in zip(plan, run_parallel(tasks, label="Variants").values()):
+        if not draft: continue
+        fixed, metrics = score_draft(draft, p["keywords"])
+        ranked.append({"label": label, "temperature": t, **metrics, "post": fixed})
+    ranked.sort(key=lambda v: -v["score"])
+    if ranked: add_log("🧪 Variants ranked: " + ", ".join(f"{v['label']} {v['score']:.2f}" for v in ranked))
+    return ranked
+
+# --- IMAGE CACHE ---
+# Generated art is downloaded once (DALL-E URLs expire) and kept as 16:9 WebP/JPEG variants.
+# Session and job state hold the image digest; a plain URL means the download failed.
+IMAGE_DIR = os.path.join(DATA_DIR, "images")
+IMAGE_CACHE_BYTES = int(os.environ.get("SHARP_BLOG_IMAGE_MB", "256")) * 1024 * 1024
+IMAGE_HISTORY = 8
+
+def cache_art(url):
+    if not url or image_store.is_digest(url): return url
     try:
+        digest = image_store.fetch(url, IMAGE_DIR, get_http(), HTTP_TIMEOUT)
+        image_store.prune(IMAGE_DIR, IMAGE_CACHE_BYTES)
+        return digest
+    except Exception as e:
+        add_log(f"Image cache error: {e}")
+        return url
+
+def art_file(img, variant="publish"):
+    # Local file for a cached image, else the URL as given
+    if image_store.is_digest(img): return image_store.find(IMAGE_DIR, img, variant)
+    return img
+
+GHOST_TOKEN_TTL = 300
+
+@st.cache_resource
+def ghost_token_cache():
+    return {"token": None, "exp": 0, "lock": threading.Lock()}
+
+def ghost_token():
+    # Ghost admin JWTs live 5 minutes; re-sign only when the cached one is about to lapse
+    cache = ghost_token_cache()
+    with cache["lock"]:
+        now = int(time.time())
+        if cache["token"] and cache["exp"] - now > 60: return cache["token"]
         id, sec = GHOST_ADMIN_KEY.split(':')
-        iat = int(datetime.datetime.now().timestamp())
-        token = jwt.encode({'iat': iat, 'exp': iat+300, 'aud': '/admin/'}, bytes.fromhex(sec), algorithm='HS256', headers={'kid': id})
-        
-        final_img = img_url
-        if img_url and "oaidalleapiprod" in img_url:
-            img_data = requests.get(img_url).content
-            files = {'file': (f"img_{iat}.png", img_data, 'image/png')}
-            up_res = requests.post(f"{GHOST_API_URL}/ghost/api/admin/images/upload/", headers={'Authorization': f'Ghost {token}'}, files=files)
-            if up_res.status_code == 201: final_img = up_res.json()['images'][0]['url']
-
-        safe_excerpt = data['excerpt'][:300] if data['excerpt'] else ""
-        body = {
-            "posts": [{
-                "title": data['title'], 
-                "html": data['html_content'], 
-                "feature_image": final_img, 
-                "custom_excerpt": safe_excerpt, 
-                "status": "draft", 
-                "tags": [{"name": t} for t in tags], 
-                "meta_title": data.get('meta_title'), 
-                "meta_description": data.get('meta_description')
-            }]
-        }
-        res = requests.post(f"{GHOST_API_URL}/ghost/api/admin/posts/?source=html", json=body, headers={'Authorization': f'Ghost {token}'})
-        return res.status_code == 201
+        cache["token"] = jwt.encode({'iat': now, 'exp': now + GHOST_TOKEN_TTL, 'aud': '/admin/'}, bytes.fromhex(sec), algorithm='HS256', headers={'kid': id})
+        cache["exp"] = now + GHOST_TOKEN_TTL
+        return cache["token"]
+
+def ghost_upload_image(headers, filename, fileobj, mime):
+    url = f"{GHOST_API_URL}/ghost/api/admin/images/upload/"
+    if MultipartEncoder:
+        form = MultipartEncoder(fields={'file': (filename, fileobj, mime)})
+        return get_http().post(url, data=form, headers={**headers, 'Content-Type': form.content_type}, timeout=HTTP_TIMEOUT)
+    return get_http().post(url, files={'file': (filename, fileobj, mime)}, headers=headers, timeout=HTTP_TIMEOUT)
+
+PUBLISH_WORKERS = 4
+
+def ghost_feature_image(img):
+    # Local art is uploaded as the optimized 16:9 variant, never the original PNG
+    if img and "oaidalleapiprod" in img: img = cache_art(img)
+    # Failures raise, so the publisher never indexes a post whose image did not make it
+    if not image_store.is_digest(img): return img
+    path = art_file(img)
+    if not path: raise ghost_publish.GhostError(404, f"cached image {img[:12]} was pruned; regenerate the art")
+    with open(path, "rb") as f:
+        res = ghost_upload_image({'Authorization': f'Ghost {ghost_token()}'}, f"img_{img[:16]}{os.path.splitext(path)[1]}", f, image_store.mime_of(path))
+    if res.status_code != 201: raise ghost_publish.GhostError(res.status_code, f"image upload failed: {res.text[:200]}")
+    return res.json()['images'][0]['url']
+
+@st.cache_resource
+def get_publisher():
+    return ghost_publish.GhostPublisher(GHOST_API_URL, ghost_token, get_http(), DB_PATH, HTTP_TIMEOUT,
+                                        upload_image=ghost_feature_image, workers=PUBLISH_WORKERS)
+
+def upload_ghost(data, img_url, tags, key=None, status="draft", published_at=None):
+    # key makes the publish idempotent: the same draft or job always lands on the same Ghost post
+    add_log("Publishing to Ghost...")
+    try:
+        res = get_publisher().publish(data, key or uuid.uuid4().hex[:12], status, published_at, tags, img_url)
+        add_log(f"Ghost: {res['action']} '{res['slug']}' ({res['status']})")
+        return res
     except Exception as e:
         add_log(f"Ghost Error: {e}")
-        return False
+        return None
+
+# --- DRAFT HISTORY ---
+# Each generate, refine, manual edit and restore is stored as a zlib-compressed revision. All but
+# every KEYFRAME_EVERY-th revision compress against the previous one as a preset dictionary, so
+# small edits cost a few hundred bytes and a restore never decodes more than a short chain.
+POST_FIELDS = ('title', 'excerpt', 'html_content', 'meta_title', 'meta_description')
+KEYFRAME_EVERY = 10
+HISTORY_LIMIT = 50
+
+def post_text(post):
+    return json.dumps({k: post.get(k) or "" for k in POST_FIELDS}, sort_keys=True).encode()
+
+def post_digest(post):
+    return hashlib.sha256(post_text(post)).hexdigest()
+
+def create_draft(owner, title):
+    draft_id, now = uuid.uuid4().hex[:12], time.time()
+    with closing(db()) as c:
+        c.execute("INSERT INTO drafts (id, owner, title, created, updated) VALUES (?, ?, ?, ?, ?)", (draft_id, owner, title, now, now))
+    return draft_id
+
+def draft_owner(draft_id):
+    with closing(db()) as c:
+        row = c.execute("SELECT owner FROM drafts WHERE id=?", (draft_id,)).fetchone()
+    return row[0] if row else None
+
+def _revision_text(c, draft_id, rev):
+    base, blob = c.execute("SELECT base, blob FROM revisions WHERE draft_id=? AND rev=?", (draft_id, rev)).fetchone()
+    d = zlib.decompressobj(zdict=_revision_text(c, draft_id, base)) if base else zlib.decompressobj()
+    return d.decompress(blob) + d.flush()
+
+def save_revision(draft_id, kind, post):
+    text, digest = post_text(post), post_digest(post)
+    with closing(db()) as c:
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            last = c.execute("SELECT rev, digest FROM revisions WHERE draft_id=? ORDER BY rev DESC LIMIT 1", (draft_id,)).fetchone()
+            if last and last[1] == digest:
+                c.execute("COMMIT")
+                return last[0]
+            rev = last[0] + 1 if last else 1
+            base = rev - 1 if rev % KEYFRAME_EVERY != 1 else None
+            comp = zlib.compressobj(9, zdict=_revision_text(c, draft_id, base)) if base else zlib.compressobj(9)
+            blob = comp.compress(text) + comp.flush()
+            now = time.time()
+            c.execute("INSERT INTO revisions (draft_id, rev, kind, title, digest, base, size, blob, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                      (draft_id, rev, kind, post.get('title'), digest, base, len(blob), blob, now))
+            c.execute("UPDATE drafts SET title=?, updated=? WHERE id=?", (post.get('title'), now, draft_id))
+            c.execute("COMMIT")
+            return rev
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+
+def load_revision(draft_id, rev=None):
+    with closing(db()) as c:
+        if rev is None: rev = c.execute("SELECT MAX(rev) FROM revisions WHERE draft_id=?", (draft_id,)).fetchone()[0]
+        if rev is None: return None
+        return json.loads(_revision_text(c, draft_id, rev))
+
+def list_revisions(draft_id, limit=HISTORY_LIMIT):
+    with closing(db()) as c:
+        return c.execute("SELECT rev, kind, title, size, created FROM revisions WHERE draft_id=? ORDER BY rev DESC LIMIT ?",
+                         (draft_id, limit)).fetchall()
+
+def list_drafts(owner, limit=HISTORY_LIMIT):
+    with closing(db()) as c:
+        return c.execute("SELECT id, title, updated FROM drafts WHERE owner=? ORDER BY updated DESC LIMIT ?", (owner, limit)).fetchall()
+
+def diff_lines(post):
+    body = re.sub(r'(</(?:p|h[1-6]|li|ul|ol|blockquote|pre|table)>)', r'\1\n', post.get('html_content') or "")
+    return [f"# {post.get('title') or ''}", f"> {post.get('excerpt') or ''}", ""] + [l for l in body.splitlines() if l.strip()]
+
+def revision_diff(old, new):
+    table = difflib.HtmlDiff(wrapcolumn=70).make_table(diff_lines(old), diff_lines(new), "older", "newer", context=True, numlines=1)
+    return f"""<style>
+        table.diff {{font-family: monospace; font-size: 12px; border: none; color: #ddd;}}
+        .diff_header {{color: #888;}} td.diff_header {{text-align: right;}}
+        .diff_add {{background: #0f3d1f;}} .diff_chg {{background: #3d3a0f;}} .diff_sub {{background: #4a1414;}}
+        </style>{table}"""
+
+def editor_post():
+    blog = st.session_state.elite_blog_v8 or {}
+    return {'title': st.session_state.final_title, 'excerpt': st.session_state.final_excerpt,
+            'html_content': st.session_state.final_content,
+            'meta_title': blog.get('meta_title'), 'meta_description': blog.get('meta_description')}
+
+def show_post(post):
+    # Only safe before the editor widgets are drawn in this run
+    st.session_state.elite_blog_v8 = {**(st.session_state.elite_blog_v8 or {}), **post}
+    st.session_state.final_title = post['title']
+    st.session_state.final_content = post['html_content']
+    st.session_state.final_excerpt = post['excerpt']
+
+def record_revision(kind, post=None):
+    if not st.session_state.draft_id: return
+    post = post or editor_post()
+    digest = post_digest(post)
+    if digest == st.session_state.draft_digest: return
+    save_revision(st.session_state.draft_id, kind, post)
+    st.session_state.draft_digest = digest
+
+def open_draft(draft_id, rev=None):
+    post = load_revision(draft_id, rev)
+    if not post: return False
+    st.session_state.draft_id = draft_id
+    st.query_params["draft"] = draft_id
+    show_post(post)
+    st.session_state.draft_digest = post_digest(post)
+    return True
+
+# --- BACKGROUND JOBS ---
+JOB_WORKERS = int(os.environ.get("SHARP_BLOG_JOB_WORKERS", "4"))
+UPLOAD_DIR = os.path.join(DATA_DIR, "uploads")
+BATCH_DIR = os.path.join(DATA_DIR, "batches")
+AUDIO_EXTS = ('.mp3', '.mp4', '.wav', '.m4a')
+EMPTY_SOCIALS = {"linkedin": "", "twitter_thread": [], "reddit": ""}
+
+class Job:
+    """
+    One pipeline run persisted in the jobs table. Stage outputs are saved as each stage
+    finishes, so a resumed job skips work (and spend) that already happened.
+    """
+    COLUMNS = "id, owner, status, stage, params, outputs, log, costs, error, partial"
+
+    def __init__(self, row):
+        self.id, self.owner, self.status, self.stage, params, outputs, log, costs, self.error, partial = row
+        self.params, self.outputs, self.log_events, self.costs = json.loads(params), json.loads(outputs), json.loads(log), json.loads(costs)
+        self.partial = json.loads(partial) if partial else None
+        self.lock = threading.RLock()
+        self._partial_saved = 0.0
+
+    @classmethod
+    def create(cls, owner, params):
+        job_id, now = uuid.uuid4().hex[:12], time.time()
+        costs = {"costs": {"Anthropic": 0.0, "OpenAI": 0.0, "Perplexity": 0.0}, "cache": {"hits": 0, "misses": 0, "saved": 0.0}, "calls": []}
+        with closing(db()) as c:
+            c.execute("INSERT INTO jobs (id, owner, status, stage, params, outputs, log, costs, created, updated) "
+                      "VALUES (?, ?, 'queued', '', ?, '{}', '[]', ?, ?, ?)", (job_id, owner, json.dumps(params), json.dumps(costs), now, now))
+        return job_id
+
+    @classmethod
+    def load(cls, job_id):
+        with closing(db()) as c:
+            row = c.execute(f"SELECT {cls.COLUMNS} FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return cls(row) if row else None
+
+    def save(self, **fields):
+        with self.lock:
+            for k, v in fields.items(): setattr(self, k, v)
+            with closing(db()) as c:
+                c.execute("UPDATE jobs SET status=?, stage=?, outputs=?, log=?, costs=?, error=?, partial=?, updated=? WHERE id=?",
+                          (self.status, self.stage, json.dumps(self.outputs, default=str), json.dumps(self.log_events),
+                           json.dumps(self.costs), self.error, json.dumps(self.partial) if self.partial else None, time.time(), self.id))
+
+    def log(self, line):
+        with self.lock:
+            self.log_events.insert(0, line)
+            self.save()
+
+    def set_partial(self, title, html):
+        # Any worker process may be polling this job, so the live draft goes through the table (at most 1/s)
+        self.partial = {"title": title, "html": html}
+        if time.time() - self._partial_saved >= 1.0:
+            self._partial_saved = time.time()
+            with closing(db()) as c:
+                c.execute("UPDATE jobs SET partial=?, updated=? WHERE id=?", (json.dumps(self.partial), time.time(), self.id))
+
+JOB_POLL = 1.0
+JOB_HEARTBEAT = 15
+JOB_STALE_AFTER = 90  # a running job nobody has touched for this long is assumed orphaned
+JOB_RETENTION_DAYS = float(os.environ.get("SHARP_BLOG_JOB_DAYS", "14"))
+JOB_PRUNE_EVERY = 3600
+
+def discard_upload(path):
+    if not path: return
+    try: os.remove(path)
+    except FileNotFoundError: pass
+
+def prune_jobs():
+    # Finished jobs past the retention window go, with their uploads; stray uploads (a job that
+    # never ran) and batch result files are dropped by age alone
+    cutoff = time.time() - JOB_RETENTION_DAYS * 86400
+    with closing(db()) as c:
+        rows = c.execute("SELECT json_extract(params, '$.upload') FROM jobs WHERE status IN ('done', 'failed') AND updated < ?", (cutoff,)).fetchall()
+        c.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated < ?", (cutoff,))
+    for (upload,) in rows: discard_upload(upload)
+    for folder in (UPLOAD_DIR, BATCH_DIR):
+        if not os.path.isdir(folder): continue
+        for entry in os.scandir(folder):
+            if entry.is_file() and entry.stat().st_mtime < cutoff: discard_upload(entry.path)
+
+class JobRunner:
+    """
+    Worker threads claim jobs straight from the jobs table, so any worker process can pick up
+    work queued by another, and jobs orphaned by a crashed process are reclaimed once stale.
+    """
+    def __init__(self):
+        self.wake = threading.Event()
+        self.live = {}
+        self.handler = None
+        self.started = False
+        self._lock = threading.Lock()
+
+    def start(self, handler):
+        self.handler = handler  # refreshed every rerun so workers pick up the current code
+        with self._lock:
+            if self.started: return
+            self.started = True
+        for i in range(JOB_WORKERS):
+            threading.Thread(target=self._work, args=(f"{os.getpid()}-{i}",), daemon=True).start()
+        threading.Thread(target=self._heartbeat, daemon=True).start()
+
+    def submit(self, job_id):
+        self.wake.set()
+
+    def claim(self, worker):
+        now = time.time()
+        with closing(db()) as c:
+            # A single UPDATE is atomic in SQLite, so two workers can never claim the same row
+            cur = c.execute("""
+                UPDATE jobs SET status='running', worker=?, updated=? WHERE id = (
+                    SELECT id FROM jobs WHERE status='queued' OR (status='running' AND updated < ?)
+                    ORDER BY created LIMIT 1)""", (worker, now, now - JOB_STALE_AFTER))
+            if cur.rowcount != 1: return None
+            row = c.execute("SELECT id FROM jobs WHERE worker=? AND status='running' ORDER BY updated DESC LIMIT 1", (worker,)).fetchone()
+        return row[0] if row else None
+
+    def _heartbeat(self):
+        pruned = 0.0
+        while True:
+            time.sleep(JOB_HEARTBEAT)
+            if time.time() - pruned > JOB_PRUNE_EVERY:
+                pruned = time.time()
+                try: prune_jobs()
+                except Exception as e: print(f"Job prune failed: {e}", flush=True)
+            ids = list(self.live)
+            if not ids: continue
+            with closing(db()) as c:
+                c.execute(f"UPDATE jobs SET updated=? WHERE id IN ({', '.join('?' * len(ids))})", (time.time(), *ids))
+
+    def _work(self, worker):
+        while True:
+            job_id = self.claim(worker)
+            if not job_id:
+                self.wake.wait(JOB_POLL)
+                self.wake.clear()
+                continue
+            job = Job.load(job_id)
+            self.live[job.id] = job
+            JOB_LOCAL.job = job
+            try:
+                self.handler(job)
+                job.partial = None
+                job.save(status="done", stage="Done! Review below.")
+            except Exception as e:
+                job.log(f"[{datetime.datetime.now().strftime('%H:%M:%S')}] Workflow stopped: {e}")
+                job.save(status="failed", error=str(e))
+            finally:
+                JOB_LOCAL.job = None
+                self.live.pop(job.id, None)
+
+@st.cache_resource
+def get_job_runner():
+    return JobRunner()
+
+def run_stage(job, name, status, fn, required=False):
+    if name in job.outputs:
+        add_log(f"{status} already done, skipping.")
+        return job.outputs[name]
+    job.save(stage=status)
+    t0 = time.perf_counter()
+    result = fn()
+    if required and not result: raise RuntimeError(f"{name} returned nothing")
+    job.outputs[name] = result
+    job.costs.setdefault("stages", {})[name] = round(time.perf_counter() - t0, 3)
+    job.save()
+    return result
+
+def load_context(p):
+    # Only the distilled brief is persisted with the job, never the raw upload text
+    path = p.get("upload")
+    if not path: return None
+    with open(path, "rb") as f:
+        txt = transcribe_audio(f) if path.lower().endswith(AUDIO_EXTS) else extract_text(f, CONTEXT_SCAN_CHARS)
+    if txt and "Error" not in txt:
+        add_log("Context Loaded.")
+        return distill_context(txt, p["topic"], p["keywords"], p["headline_hint"], p.get("summarize", False))
+    return None
+
+def run_pipeline_job(job):
+    p = job.params
+    add_log("Workflow Initialized.")
+    context = run_stage(job, "context", "Processing Context...", lambda: load_context(p))
+    discard_upload(p.get("upload"))  # the brief is saved with the job; a resume never reads the file again
+    research = run_stage(job, "research", "Researching...", lambda: agent_research(p["topic"], bool(context)), required=True)
+
+    def on_partial(title, html): job.set_partial(title, html)
+    def draft():
+        if p.get("variants", 1) <= 1:
+            return enforce_style(agent_writer(
+                p["topic"], p["headline_hint"], research, p["style"], p["tone"], p["keywords"], p["audience"], context, p["model"],
+                on_partial=on_partial if p["stream"] else None))
+        variants = write_variants(p, research, context, on_partial if p["stream"] else None)
+        job.outputs["variants"] = variants
+        return variants[0]["post"] if variants else None
+    blog = run_stage(job, "draft", "Drafting...", draft, required=True)
+
+    finish = run_stage(job, "finish", "Socials & Art...", lambda: run_parallel({
+        "socials": (lambda: agent_socials(blog['html_content'], p["model"]), 120, EMPTY_SOCIALS),
+        "art": (lambda: cache_art(agent_artist(p["topic"], p["tone"], p["audience"], custom_prompt=p["img_prompt"])), 150, None),
+    }, label="Socials & Art"))
+
+    if p.get("publish"):
+        run_stage(job, "publish", "Publishing...", lambda: upload_ghost(blog, finish.get("art"), ["Sharp Blog", "Batch"], key=job.id))
+
+def run_job(job):
+    try:
+        run_pipeline_job(job)
+        if job.params.get("batch"): append_batch_result(job, "done")
+    except Exception as e:
+        if job.params.get("batch"): append_batch_result(job, f"failed: {e}")
+        raise
+
+# --- BATCH MODE ---
+BATCH_FIELDS = ("topic", "headline_hint", "tone", "audience", "keywords", "img_prompt")
+
+def parse_topic_rows(file):
+    raw = file.getvalue().decode("utf-8-sig")
+    if file.name.lower().endswith(".jsonl"): rows = [json.loads(line) for line in raw.splitlines() if line.strip()]
+    else: rows = list(csv.DictReader(io.StringIO(raw)))
+    return [{k: str(r.get(k) or "").strip() for k in BATCH_FIELDS} for r in rows if str(r.get("topic") or "").strip()]
+
+def match_option(value, options, default):
+    # Rows may say "Technical" for "Technical (Precise, industry jargon, dense)"
+    for opt in options:
+        if value and opt.lower().startswith(value.lower()): return opt
+    return default
+
+def batch_path(batch_id):
+    return os.path.join(BATCH_DIR, f"{batch_id}.jsonl")
+
+def append_batch_result(job, status):
+    # One line per finished post, appended as soon as it lands
+    finish = job.outputs.get("finish") or {}
+    record = {"job": job.id, "topic": job.params["topic"], "status": status, **(job.outputs.get("draft") or {}),
+              "socials": finish.get("socials"), "image": art_file(finish.get("art")), "ghost_draft": job.outputs.get("publish"),
+              "costs": job.costs["costs"]}
+    os.makedirs(BATCH_DIR, exist_ok=True)
+    with open(batch_path(job.params["batch"]), "a", encoding="utf-8") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)  # several worker processes may finish posts of one batch at once
+        f.write(json.dumps(record) + "\n")
+
+def batch_jobs(batch_id, owner):
+    with closing(db()) as c:
+        return c.execute("SELECT json_extract(params, '$.topic'), status, stage, created, updated, id FROM jobs "
+                         "WHERE json_extract(params, '$.batch') = ? AND owner = ? ORDER BY created", (batch_id, owner)).fetchall()
+
+def publish_batch(batch_id, owner, status, first_at=None, every_hours=0.0):
+    # Finished posts go out concurrently; scheduled ones are spaced every_hours apart from first_at
+    jobs = [j for j in (Job.load(r[5]) for r in batch_jobs(batch_id, owner)) if j and j.status == "done"]
+    items = [{"post": j.outputs["draft"], "key": j.id, "status": status, "tags": ["Sharp Blog", "Batch"],
+              "image": (j.outputs.get("finish") or {}).get("art"),
+              "published_at": first_at + datetime.timedelta(hours=every_hours * n) if status == "scheduled" else None}
+             for n, j in enumerate(jobs)]
+    results = get_publisher().publish_many(items, ctx_executor(PUBLISH_WORKERS))
+    add_log(f"Ghost batch: {dict(Counter(r['action'] for r in results))}")
+    return [{"Topic": j.params["topic"], **r} for j, r in zip(jobs, results)]
+
+def apply_job(job):
+    out = job.outputs
+    blog, finish = out["draft"], out.get("finish") or {}
+    st.session_state.elite_blog_v8 = blog
+    st.session_state.final_title = blog['title']
+    st.session_state.final_content = blog['html_content']
+    st.session_state.final_excerpt = blog['excerpt']
+    st.session_state.elite_socials = finish.get("socials") or EMPTY_SOCIALS
+    st.session_state.variants = out.get("variants") or []
+    if finish.get("art"):
+        st.session_state.elite_image_v8 = finish["art"]
+        st.session_state.image_history = [finish["art"]]
+    st.session_state.transcript_context = bool(out.get("context"))
+    st.session_state.last_claude_model = job.params["model"]
+    for provider, amount in job.costs["costs"].items(): st.session_state.costs[provider] += amount
+    for k, v in job.costs["cache"].items(): st.session_state.cache_stats[k] += v
+    st.session_state.telemetry += job.costs.get("calls", [])
+    st.session_state.log_events = job.log_events + st.session_state.log_events
+    st.session_state.current_workflow_status = "Done! Review below."
+    st.session_state.draft_id = create_draft(job.owner, blog['title'])
+    st.query_params["draft"] = st.session_state.draft_id
+    record_revision("generate", editor_post())
+
+job_runner = get_job_runner()
+job_runner.start(run_job)
+
+# A finished job is applied before any widget is drawn so the editor fields can be filled
+if st.session_state.active_job:
+    finished = Job.load(st.session_state.active_job)
+    if finished and finished.owner != st.session_state.editor_id: finished = None  # someone else's job: never adopt it
+    if not finished or finished.status == "done":
+        if finished: apply_job(finished)
+        st.session_state.active_job = None
+        if "job" in st.query_params: del st.query_params["job"]
+
+# A reloaded tab reopens its latest draft revision
+if st.session_state.draft_id and st.session_state.elite_blog_v8 is None and not st.session_state.active_job:
+    if draft_owner(st.session_state.draft_id) != st.session_state.editor_id or not open_draft(st.session_state.draft_id):
+        st.session_state.draft_id = None
+        if "draft" in st.query_params: del st.query_params["draft"]
 
 # --- UI LAYOUT ---
 
@@ -384,7 +1536,7 @@ with col2:
     st.write("")
     st.write("")
     st.markdown("### 📎 Context")
-    uploaded_file = st.file_uploader("", type=['txt','pdf','docx','mp3','mp4'], label_visibility="collapsed")
+    uploaded_file = st.file_uploader("", type=['txt','md','pdf','docx','mp3','mp4','m4a','wav'], label_visibility="collapsed")
 
 with col3:
     st.markdown("### 🎯 Target")
@@ -419,12 +1571,13 @@ with col3:
 # --- TOPIC SECTION ---
 st.markdown("---")
 st.markdown("### 💡 Topic")
-topic = st.text_area("", height=100, placeholder="Enter prompt...", label_visibility="collapsed")
+topic = st.text_area("", height=100, placeholder="Enter prompt...", label_visibility="collapsed", key="topic")
 
 # ROW 2: HEADLINE & IMAGE PROMPT (Side by Side)
 c_head, c_img = st.columns(2)
 with c_head:
     headline_hint = st.text_input("Suggested Headline (Optional)", placeholder="Enter a headline to guide the AI...")
+    if st.session_state.headline_ideas: st.caption(st.session_state.headline_ideas)
 with c_img:
     img_prompt = st.text_input("Custom Image Prompt (Optional)", placeholder="Describe the image... (Leave empty for auto-gen)")
 
@@ -436,7 +1589,13 @@ with c_seo_txt:
     st.session_state.seo_keywords = keywords
 with c_seo_btn:
     if st.button("✨ Choose For Me"):
-        if topic: st.session_state.seo_keywords = agent_seo(topic)
+        if topic:
+            tasks = {"seo": (lambda: agent_seo(topic), 60, "")}
+            if not headline_hint: tasks["headlines"] = (lambda: agent_headlines(topic), 60, "")
+            picks = run_parallel(tasks, label="SEO & Headlines")
+            st.session_state.seo_keywords = picks["seo"]
+            if picks.get("headlines"): st.session_state.headline_ideas = picks["headlines"]
+            st.rerun()
 
 # --- STATUS & COST ---
 st.markdown("---")
@@ -446,7 +1605,35 @@ with s1:
 with s2:
     with st.expander("💰 Costs & Settings", expanded=False):
         st.write(st.session_state.costs)
+        cs = st.session_state.cache_stats
+        st.caption(f"Cache: {cs['hits']} hits / {cs['misses']} misses, ${cs['saved']:.3f} saved")
+        calls = st.session_state.telemetry
+        if calls:
+            last_run = calls[-1]["run"]
+            st.markdown(f"**Last run** ({last_run})")
+            st.dataframe(summarize_calls([c for c in calls if c["run"] == last_run]), use_container_width=True)
+            st.markdown("**This session**")
+            st.dataframe(summarize_calls(calls), use_container_width=True)
+        version = ledger_version()
+        if version:
+            st.markdown("**All time** (every worker)")
+            st.dataframe(ledger_totals(version), use_container_width=True)
+            # Callables: the ledger is only read and serialized when a button is actually clicked
+            st.caption(f"Exports hold the latest {LEDGER_EXPORT_ROWS:,} calls.")
+            st.download_button("⬇️ Call log (JSONL)", telemetry_jsonl, file_name="telemetry.jsonl", mime="application/json")
+            st.download_button("⬇️ Call log (CSV)", telemetry_csv, file_name="telemetry.csv", mime="text/csv")
         st.selectbox("Model:", ["claude-sonnet-4-20250514", "claude-3-5-sonnet", "claude-3-opus"], key="claude_model_selection")
+        st.toggle("Stream draft preview", value=True, key="stream_draft")
+        st.toggle("Summarize long context (map-reduce)", value=False, key="summarize_context")
+        st.slider("Draft variants (written in parallel, ranked)", 1, MAX_VARIANTS, 1, key="draft_variants")
+        st.markdown("**Startup & reruns** (this worker)")
+        with PROFILE["lock"]: reruns = sorted(PROFILE["reruns"])
+        p1, p2, p3 = st.columns(3)
+        p1.metric("Cold imports", f"{PROFILE['cold_import'] * 1000:.0f} ms")
+        p2.metric("Last rerun", f"{st.session_state.get('last_rerun', 0) * 1000:.0f} ms")
+        p3.metric(f"p95 of {len(reruns)}", f"{reruns[int(0.95 * (len(reruns) - 1))] * 1000:.0f} ms" if reruns else "n/a")
+        if PROFILE["lazy"]:
+            st.caption("Loaded on first use: " + ", ".join(f"{k} {v * 1000:.0f} ms" for k, v in sorted(PROFILE["lazy"].items(), key=lambda kv: -kv[1])))
 
 # START BUTTON (GRADIENT VIA CSS)
 st.write("")
@@ -455,39 +1642,95 @@ if st.button("Start Sharp Bloggling", type="primary", use_container_width=True):
         st.warning("Please enter a topic.")
     else:
         st.session_state.log_events = [] 
-        add_log("Workflow Initialized.")
-        st.session_state.current_workflow_status = "Processing Context..."
-        st.session_state.last_claude_model = st.session_state.claude_model_selection
-        st.session_state.transcript_context = False
-        transcript_txt = None
-        
+        upload = None
         if uploaded_file:
-            if uploaded_file.name.endswith(('.mp3','.mp4','.wav','.m4a')): transcript_txt = transcribe_audio(uploaded_file)
-            else: transcript_txt = extract_text(uploaded_file)
-            if transcript_txt and "Error" not in transcript_txt:
-                st.session_state.transcript_context = True
-                add_log("Context Loaded.")
-        
-        st.session_state.current_workflow_status = "Researching..."
-        research_data = agent_research(topic, st.session_state.transcript_context)
-        
-        if research_data:
-            st.session_state.current_workflow_status = "Drafting..."
-            blog = agent_writer(topic, headline_hint, research_data, style_sample, tone_setting, keywords, audience_setting, transcript_txt, st.session_state.claude_model_selection)
-            
-            if blog:
-                st.session_state.elite_blog_v8 = blog
-                st.session_state.final_title = blog['title']
-                st.session_state.final_content = blog['html_content']
-                st.session_state.final_excerpt = blog['excerpt']
-                
-                st.session_state.current_workflow_status = "Socials & Art..."
-                st.session_state.elite_socials = agent_socials(blog['html_content'], st.session_state.claude_model_selection)
-                img = agent_artist(topic, tone_setting, audience_setting, custom_prompt=img_prompt)
-                if img: st.session_state.elite_image_v8 = img
-                
-                st.session_state.current_workflow_status = "Done! Review below."
-                st.rerun()
+            os.makedirs(UPLOAD_DIR, exist_ok=True)
+            upload = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex[:8]}_{os.path.basename(uploaded_file.name)}")
+            with open(upload, "wb") as f: f.write(uploaded_file.getbuffer())
+        job_id = Job.create(st.session_state.editor_id, {
+            "topic": topic, "headline_hint": headline_hint, "style": style_sample, "tone": tone_setting,
+            "keywords": keywords, "audience": audience_setting, "img_prompt": img_prompt, "upload": upload,
+            "model": st.session_state.claude_model_selection, "stream": st.session_state.stream_draft,
+            "summarize": st.session_state.summarize_context,
+            "variants": st.session_state.draft_variants, "headlines": parse_headlines(st.session_state.headline_ideas),
+        })
+        job_runner.submit(job_id)
+        st.session_state.active_job = job_id
+        st.query_params["job"] = job_id  # lets a reloaded tab reattach to the run
+        st.session_state.current_workflow_status = "Running in background..."
+        st.rerun()
+
+with st.expander("📦 Batch Mode (CSV / JSONL of topics)"):
+    st.caption("Columns: topic (required), headline_hint, tone, audience, keywords, img_prompt. Blank tone/audience use the selections above.")
+    batch_file = st.file_uploader("Topics file", type=['csv', 'jsonl'], key="batch_file")
+    batch_publish = st.checkbox("Create Ghost drafts as posts finish", key="batch_publish")
+    if st.button("📦 Queue Batch", disabled=batch_file is None):
+        rows = parse_topic_rows(batch_file)
+        batch_id = uuid.uuid4().hex[:8]
+        for row in rows:
+            job_runner.submit(Job.create(st.session_state.editor_id, {
+                "topic": row["topic"], "headline_hint": row["headline_hint"], "style": style_sample,
+                "tone": match_option(row["tone"], tone_options, tone_setting),
+                "audience": match_option(row["audience"], aud_options, audience_setting),
+                "keywords": row["keywords"] or keywords, "img_prompt": row["img_prompt"], "upload": None,
+                "model": st.session_state.claude_model_selection, "stream": False,
+                "batch": batch_id, "publish": batch_publish,
+            }))
+        st.session_state.batch_id = batch_id
+        st.success(f"Queued {len(rows)} posts as batch {batch_id}.")
+
+    @st.fragment(run_every=3)
+    def batch_monitor(batch_id):
+        rows = batch_jobs(batch_id, st.session_state.editor_id)
+        done = [r for r in rows if r[1] in ("done", "failed")]
+        if rows and done:
+            hours = max(max(r[4] for r in done) - min(r[3] for r in rows), 1) / 3600
+            st.caption(f"{len(done)}/{len(rows)} finished · {len([r for r in done if r[1] == 'done']) / hours:.1f} posts/hour")
+        st.dataframe([{"Topic": r[0], "Status": r[1], "Stage": r[2]} for r in rows], use_container_width=True)
+        if os.path.exists(batch_path(batch_id)):
+            with open(batch_path(batch_id), "rb") as f:
+                st.download_button("⬇️ Results (JSONL)", f.read(), file_name=f"batch_{batch_id}.jsonl", mime="application/json")
+
+    if st.session_state.get("batch_id"):
+        batch_monitor(st.session_state.batch_id)
+        b1, b2, b3 = st.columns(3)
+        with b1: batch_status = st.selectbox("Publish as", ghost_publish.STATUSES, format_func=str.title, key="batch_status")
+        first_at, every = None, 0.0
+        if batch_status == "scheduled":
+            with b2:
+                first_day = st.date_input("First post (UTC)", key="batch_first_day")
+                first_time = st.time_input("At", key="batch_first_time")
+            with b3: every = st.number_input("Hours between posts", 0.0, 168.0, 24.0, key="batch_every")
+            first_at = datetime.datetime.combine(first_day, first_time, tzinfo=datetime.timezone.utc)
+        if st.button("🚀 Publish Finished Posts"):
+            with st.spinner("Publishing..."):
+                st.dataframe(publish_batch(st.session_state.batch_id, st.session_state.editor_id, batch_status, first_at, every),
+                             use_container_width=True)
+
+@st.fragment(run_every=1.5)
+def job_monitor(job_id):
+    job = Job.load(job_id)
+    if not job or job.status == "done":
+        st.rerun()
+    if job.status == "failed":
+        st.error(f"Workflow stopped at '{job.stage}': {job.error}")
+        if st.button("↻ Resume", key="resume_job"):
+            job.save(status="queued", error=None)
+            job_runner.submit(job.id)
+        return
+    st.info(f"**Job {job.id}:** {job.stage or 'Queued...'}")
+    st.text("\n".join(job.log_events[:6]))
+    if job.partial:
+        st.markdown(f"""
+        <div style="background-color: white; color: black; padding: 40px; border-radius: 10px; font-family: sans-serif; max-height: 600px; overflow-y: auto;">
+            <h1 style="color: black;">{job.partial["title"] or "Drafting..."}</h1>
+            <hr>
+            {job.partial["html"] or ""}
+        </div>
+        """, unsafe_allow_html=True)
+
+if st.session_state.active_job:
+    job_monitor(st.session_state.active_job)
 
 # --- PREVIEW & REFINE ---
 if st.session_state.elite_blog_v8:
@@ -501,15 +1744,27 @@ if st.session_state.elite_blog_v8:
 
         with c_preview_img:
             if st.session_state.get('elite_image_v8'):
-                st.image(st.session_state.elite_image_v8, use_container_width=True)
+                preview = art_file(st.session_state.elite_image_v8, "preview")
+                if preview: st.image(preview, use_container_width=True)
+                else: st.caption("Image no longer in the local cache.")
                 with st.expander("🎨 Regenerate Image"):
                     regen_prompt = st.text_input("New Image Prompt", placeholder="Describe desired image...", key="regen_box")
                     if st.button("Regenerate Art", key="regen_btn"):
                         with st.spinner("Painting..."):
-                            new_url = agent_artist(topic, tone_setting, audience_setting, custom_prompt=regen_prompt)
+                            new_url = cache_art(agent_artist(topic, tone_setting, audience_setting, custom_prompt=regen_prompt))
                             if new_url: 
                                 st.session_state.elite_image_v8 = new_url
+                                st.session_state.image_history = ([new_url] + [i for i in st.session_state.image_history if i != new_url])[:IMAGE_HISTORY]
                                 st.rerun()
+                    earlier = [i for i in st.session_state.image_history if i != st.session_state.elite_image_v8 and art_file(i, "preview")]
+                    if earlier:
+                        st.caption("Earlier versions")
+                        for n, (col, img) in enumerate(zip(st.columns(len(earlier)), earlier)):
+                            with col:
+                                st.image(art_file(img, "preview"), use_container_width=True)
+                                if st.button("Use", key=f"use_img_{n}"):
+                                    st.session_state.elite_image_v8 = img
+                                    st.rerun()
 
         with c_preview_html:
              html_preview = f"""
@@ -527,43 +1782,122 @@ if st.session_state.elite_blog_v8:
         c_ref_txt, c_ref_btn = st.columns([3, 1])
         with c_ref_txt:
             refine_inst = st.text_area("Instructions", height=100, placeholder="e.g. Make it punchier...")
+            sections = post_sections.split_sections(st.session_state.final_content)
+            refine_mode = st.radio("Scope", ["Only affected sections", "Whole post"], horizontal=True, key="refine_mode")
+            refine_picks = st.multiselect("Sections (optional, auto-detected when empty)", range(len(sections)),
+                                          format_func=lambda i: f"{i}. {post_sections.section_title(sections[i])}", key="refine_picks")
         with c_ref_btn:
             st.write("")
             st.write("")
             if st.button("✨ Refine"):
                 with st.spinner("Refining..."):
-                    curr = {
-                        'title': st.session_state.final_title,
-                        'excerpt': st.session_state.final_excerpt,
-                        'html_content': st.session_state.final_content,
-                        'meta_title': st.session_state.elite_blog_v8.get('meta_title'),
-                        'meta_description': st.session_state.elite_blog_v8.get('meta_description')
-                    }
-                    new_post = agent_refine(curr, refine_inst, st.session_state.claude_model_selection)
+                    curr = editor_post()
+                    new_post = None
+                    if refine_mode == "Only affected sections":
+                        new_post = agent_refine_sections(curr, refine_inst, st.session_state.claude_model_selection, refine_picks)
+                    if not new_post:
+                        new_post = agent_refine(curr, refine_inst, st.session_state.claude_model_selection)
                     if new_post:
-                        st.session_state.final_title = new_post['title']
-                        st.session_state.final_content = new_post['html_content']
-                        st.session_state.final_excerpt = new_post['excerpt']
+                        record_revision("edit")  # keep any unsaved manual edits as their own step
+                        show_post(enforce_style({**curr, **new_post}))
+                        record_revision("refine")
                         st.rerun()
 
+        if len(st.session_state.variants) > 1:
+            with st.expander(f"🧪 Draft Variants ({len(st.session_state.variants)}, best first)", expanded=True):
+                for n, (col, v) in enumerate(zip(st.columns(len(st.session_state.variants)), st.session_state.variants)):
+                    with col:
+                        coverage = "n/a" if v["coverage"] is None else f"{v['coverage']:.0%}"
+                        st.markdown(f"**#{n + 1} · score {v['score']:.2f}**")
+                        st.caption(f"{v['label']} · keywords {coverage} · ease {v['ease'] if v['ease'] is not None else 'n/a'} · {v['violations']} rule breaks")
+                        components.html(f"""<div style="background-color: white; color: black; padding: 16px; border-radius: 10px; font-family: sans-serif; font-size: 13px;">
+                            <h3 style="color: black;">{v['post']['title']}</h3><p><em>{v['post']['excerpt']}</em></p>{v['post']['html_content']}</div>""",
+                                        height=360, scrolling=True)
+                        current = v["post"]["html_content"] == st.session_state.final_content
+                        if st.button("✅ In Editor" if current else "Use This Draft", key=f"use_variant_{n}", disabled=current):
+                            record_revision("edit")
+                            show_post(v["post"])
+                            record_revision("variant")
+                            st.rerun()
+
+        with st.expander("🕘 Draft History"):
+            drafts = list_drafts(st.session_state.editor_id)
+            draft_ids = [d[0] for d in drafts]
+            if st.session_state.draft_id in draft_ids:
+                pick = st.selectbox("Draft", draft_ids, index=draft_ids.index(st.session_state.draft_id),
+                                    format_func=lambda i: next(f"{t or 'Untitled'} ({time.strftime('%b %d %H:%M', time.localtime(u))})"
+                                                                for d, t, u in drafts if d == i))
+                if pick != st.session_state.draft_id and open_draft(pick): st.rerun()
+                revs = list_revisions(st.session_state.draft_id)
+                labels = {r: f"r{r} · {kind} · {time.strftime('%H:%M:%S', time.localtime(ts))} · {size:,} B"
+                          for r, kind, _, size, ts in revs}
+                if len(revs) >= HISTORY_LIMIT: st.caption(f"Showing the latest {HISTORY_LIMIT} revisions.")
+                h1, h2 = st.columns(2)
+                with h1: old_rev = st.selectbox("Compare", list(labels), index=min(1, len(labels) - 1), format_func=labels.get, key="hist_old")
+                with h2: new_rev = st.selectbox("With", list(labels), index=0, format_func=labels.get, key="hist_new")
+                if old_rev != new_rev:
+                    components.html(revision_diff(load_revision(st.session_state.draft_id, old_rev),
+                                                  load_revision(st.session_state.draft_id, new_rev)), height=400, scrolling=True)
+                if st.button(f"↩️ Restore r{old_rev}", key="hist_restore"):
+                    record_revision("edit")
+                    show_post(load_revision(st.session_state.draft_id, old_rev))
+                    record_revision("restore")
+                    st.rerun()
+            else:
+                st.caption("No saved revisions yet.")
+
+        with st.expander("🧹 Style Check"):
+            fixed_post, report = style_check(editor_post())
+            if report["scores"]:
+                m1, m2, m3 = st.columns(3)
+                m1.metric("Reading Ease", report["scores"]["ease"])
+                m2.metric("Grade Level", report["scores"]["grade"])
+                m3.metric("Read Time", f"{report['scores']['minutes']} min")
+            elif not textstat_installed:
+                st.caption("Install textstat for readability scores.")
+            if report["fixed"]:
+                st.warning("Rule breaks: " + ", ".join(f"{n} {k.replace('_', ' ')}" for k, n in report["fixed"].items()))
+                if st.button("🧹 Apply Local Fixes"):
+                    record_revision("edit")
+                    show_post(fixed_post)
+                    record_revision("lint")
+                    st.rerun()
+            for issue in report["issues"]: st.caption(f"⚠️ {issue}")
+            if report["issues"] and st.button("✨ Fix Remaining With Claude"):
+                with st.spinner("Refining..."):
+                    new_post = agent_refine(fixed_post, "Fix only these issues: " + " ".join(report["issues"]), st.session_state.claude_model_selection)
+                    if new_post:
+                        record_revision("edit")
+                        show_post(enforce_style({**fixed_post, **new_post}))
+                        record_revision("refine")
+                        st.rerun()
+            if not report["fixed"] and not report["issues"]: st.caption("✅ No rule breaks.")
+
         st.markdown("### ✏️ HTML Editor")
         st.text_input("Title", key='final_title')
         st.text_area("Excerpt (Max 300)", key='final_excerpt', max_chars=300)
         st.text_area("HTML Body", key='final_content', height=600)
+        record_revision("edit")
+
+        g1, g2, g3 = st.columns(3)
+        with g1: publish_status = st.selectbox("Ghost Status", ghost_publish.STATUSES, format_func=str.title, key="publish_status")
+        publish_at = None
+        if publish_status == "scheduled":
+            with g2: publish_day = st.date_input("Publish on (UTC)", key="publish_day")
+            with g3: publish_time = st.time_input("At", key="publish_time")
+            publish_at = datetime.datetime.combine(publish_day, publish_time, tzinfo=datetime.timezone.utc)
 
         if st.button("🚀 Publish to Ghost", type="primary"):
             tags = ["Sharp Blog"] 
             if st.session_state.transcript_context: tags.append("Context Aware")
-            final_data = {
-                'title': st.session_state.final_title,
-                'excerpt': st.session_state.final_excerpt,
-                'html_content': st.session_state.final_content,
-                'meta_title': st.session_state.elite_blog_v8.get('meta_title'),
-                'meta_description': st.session_state.elite_blog_v8.get('meta_description')
-            }
-            if upload_ghost(final_data, st.session_state.get('elite_image_v8'), tags):
+            final_data = editor_post()
+            res = upload_ghost(final_data, st.session_state.get('elite_image_v8'), tags,
+                               key=st.session_state.draft_id, status=publish_status, published_at=publish_at)
+            if res and res["action"] == "unchanged":
+                st.info("Already on Ghost with this exact content.")
+            elif res:
                 celebrate_with_logos()
-                st.success("Published!")
+                st.success(f"Published! ({res['action']} as {res['status']})")
             else:
                 st.error("Failed.")
 
@@ -585,3 +1919,7 @@ if st.session_state.elite_blog_v8:
             st.markdown("### Reddit")
             rd = st.text_area("Reddit", value=s.get('reddit', ''), height=200)
             st.link_button("Post", generate_social_link(rd, "reddit"))
+
+# --- PROFILING: end of script run ---
+st.session_state.last_rerun = time.perf_counter() - SCRIPT_START
+with PROFILE["lock"]: PROFILE["reruns"].append(st.session_state.last_rerun)
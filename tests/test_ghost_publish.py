@@ -0,0 +1,60 @@
+import sqlite3
+
+import pytest
+import requests
+
+from fake_providers import FakeProviders
+from ghost_publish import GhostError, GhostPublisher
+
+POST = {"title": "Hello World", "html_content": "<p>First.</p>", "excerpt": "First."}
+
+@pytest.fixture
+def ghost(tmp_path):
+    server = FakeProviders(latency={"ghost": 0}).start()
+    publisher = GhostPublisher(server.base_url, lambda: "token", requests.Session(), str(tmp_path / "index.db"))
+    yield server, publisher
+    server.shutdown()
+
+def forget(publisher, key):
+    # The POST landed but its response (and so the index write) never did
+    with sqlite3.connect(publisher.index_path) as c: c.execute("DELETE FROM ghost_index WHERE key=?", (key,))
+
+def test_orphan_with_suffixed_slug_is_updated_not_duplicated(ghost):
+    server, publisher = ghost
+    assert publisher.publish(POST, "k1")["slug"] == "hello-world"
+    first = publisher.publish(POST, "k2")
+    assert first["slug"] == "hello-world-2"
+
+    forget(publisher, "k2")
+    again = publisher.publish({**POST, "html_content": "<p>Second.</p>"}, "k2")
+    assert again["action"] == "updated" and again["id"] == first["id"]
+    assert len(server.ghost_posts) == 2
+    assert server.ghost_posts[first["id"]]["html"] == "<p>Second.</p>"
+
+def test_orphan_found_after_title_change(ghost):
+    server, publisher = ghost
+    first = publisher.publish(POST, "k1")
+    forget(publisher, "k1")
+    again = publisher.publish({**POST, "title": "A Different Title"}, "k1")
+    assert again["action"] == "updated" and again["id"] == first["id"]
+    assert len(server.ghost_posts) == 1
+
+def test_unchanged_republish_sends_nothing(ghost):
+    server, publisher = ghost
+    publisher.publish(POST, "k1")
+    before = dict(server.calls)
+    assert publisher.publish(POST, "k1")["action"] == "unchanged"
+    assert server.calls == before
+
+def test_failed_image_upload_is_not_indexed(ghost, tmp_path):
+    server, _ = ghost
+    uploads = iter([None, f"{server.base_url}/content/images/art.png"])
+    publisher = GhostPublisher(server.base_url, lambda: "token", requests.Session(), str(tmp_path / "images.db"),
+                               upload_image=lambda image: next(uploads))
+    with pytest.raises(GhostError):
+        publisher.publish(POST, "k1", image="a" * 64)
+    assert publisher.indexed("k1") is None and not server.ghost_posts
+
+    done = publisher.publish(POST, "k1", image="a" * 64)
+    assert done["action"] == "created"
+    assert server.ghost_posts[done["id"]]["feature_image"].endswith("/art.png")
@@ -0,0 +1,40 @@
+import pytest
+
+from model_json import partial_field, repair_json
+
+def test_complete_json_is_not_cut():
+    assert repair_json('{"title": "T", "tags": ["a", "b"]}') == ({"title": "T", "tags": ["a", "b"]}, None)
+
+def test_code_fences_and_leading_prose_are_ignored():
+    assert repair_json('Here you go:\n```json\n{"a": 1}\n```') == ({"a": 1}, None)
+
+def test_string_cut_mid_value_is_kept_and_reported():
+    obj, cut = repair_json('{"title": "T", "html_content": "<p>Half a sente')
+    assert obj == {"title": "T", "html_content": "<p>Half a sente"}
+    assert cut == "html_content"
+
+def test_cut_after_escape_or_partial_unicode():
+    assert repair_json('{"a": "line\\')[0] == {"a": "line"}
+    assert repair_json('{"a": "caf\\u00')[0] == {"a": "caf"}
+
+def test_array_cut_mid_item():
+    obj, cut = repair_json('{"linkedin": "L", "twitter_thread": ["one", "tw')
+    assert obj == {"linkedin": "L", "twitter_thread": ["one", "tw"]}
+    assert cut == "twitter_thread"
+
+@pytest.mark.parametrize("text", ['{"title": "T", "excerpt', '{"title": "T", "excerpt":', '{"title": "T",'])
+def test_dangling_key_is_dropped_and_nothing_is_cut(text):
+    assert repair_json(text) == ({"title": "T"}, None)
+
+def test_trailing_commas_are_dropped():
+    assert repair_json('{"a": [1, 2,], "b": 3,}') == ({"a": [1, 2], "b": 3}, None)
+
+def test_unrepairable_text_raises():
+    with pytest.raises(ValueError):
+        repair_json("no json here")
+
+def test_partial_field_decodes_a_streaming_value():
+    buf = '{"title": "Caf\\u00e9 notes", "html_content": "<p>Line one\\nLine tw'
+    assert partial_field(buf, "title") == "Café notes"
+    assert partial_field(buf, "html_content") == "<p>Line one\nLine tw"
+    assert partial_field(buf, "excerpt") is None
@@ -0,0 +1,62 @@
+import pytest
+
+from post_lint import lint_html, lint_post
+
+@pytest.mark.parametrize("text", [
+    "Override __init__ and __repr__ in the subclass.",
+    "Rated ★★★★☆ by readers.",
+    "Tests pass ✓ and the build is green ✔.",
+    "Prices rose → margins fell.",
+    "Compute 2**10 or a**b in Python.",
+    "Use snake_case__names sparingly.",
+])
+def test_ordinary_prose_is_untouched(text):
+    body, fixes, issues = lint_html(f"<p>{text}</p>")
+    assert body == f"<p>{text}</p>"
+    assert not +fixes
+
+@pytest.mark.parametrize("text, fixed", [
+    ("Ship it 🚀 today.", "Ship it today."),
+    ("Great news ✅ all round.", "Great news all round."),
+    ("We ❤️ feedback.", "We feedback."),
+    ("Family 👨‍👩‍👧 plans.", "Family plans."),
+    ("Thumbs 👍🏽 up.", "Thumbs up."),
+    ("Step 1️⃣ first.", "Step first."),
+])
+def test_emoji_removed(text, fixed):
+    body, fixes, _ = lint_html(f"<p>{text}</p>")
+    assert body == f"<p>{fixed}</p>"
+    assert fixes["emoji"] == 1
+
+def test_markdown_and_html_bold_removed():
+    body, fixes, _ = lint_html("<h2>Keep <strong>this</strong></h2><p>A **key** point and <b>another</b>.</p>")
+    assert body == "<h2>Keep <strong>this</strong></h2><p>A key point and another.</p>"
+    assert fixes["bold"] == 2
+
+def test_dashes_become_commas():
+    body, fixes, _ = lint_html("<p>Costs fell &mdash; then rose—sharply.</p>")
+    assert body == "<p>Costs fell, then rose, sharply.</p>"
+    assert fixes["em_dash"] == 2
+
+def test_inline_links_move_to_sources():
+    body, fixes, _ = lint_html('<p>See <a href="https://a.example">the report</a>.</p>'
+                               '<h2>Sources</h2><ul><li><a href="https://b.example">B</a></li></ul>')
+    assert body == ('<p>See the report.</p><h2>Sources</h2><ul><li><a href="https://b.example">B</a></li>'
+                    '<li><a href="https://a.example">the report</a></li></ul>')
+    assert fixes["inline_link"] == 1
+
+def test_code_is_left_alone():
+    body, fixes, _ = lint_html("<pre><code>x = a -- b  # 🚀 **raw**</code></pre>")
+    assert body == "<pre><code>x = a -- b  # 🚀 **raw**</code></pre>"
+    assert not +fixes
+
+def test_structure_issues_reported():
+    _, _, issues = lint_html("<p>" + "word " * 400 + "</p>")
+    assert any("paragraph runs" in i for i in issues)
+    assert any("H2" in i for i in issues)
+
+def test_lint_post_fixes_metadata():
+    post, report = lint_post({"title": "Launch day 🎉", "excerpt": "Fast — and cheap", "html_content": "<p>Hi</p>"})
+    assert post["title"] == "Launch day"
+    assert post["excerpt"] == "Fast, and cheap"
+    assert report["fixed"] == {"emoji": 1, "em_dash": 1}
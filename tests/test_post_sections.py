@@ -0,0 +1,37 @@
+import pytest
+
+from post_sections import guess_sections, split_sections
+
+POST = (
+    "<p>Cloud bills keep growing.</p>"
+    "<h2>Where the money goes</h2><p>Compute, storage, egress.</p>"
+    "<h2>Cutting waste</h2><p>Rightsizing and schedules.</p>"
+    "<h2>Conclusion</h2><p>Start with tagging.</p>"
+    "<h2>Sources</h2><ul><li>a</li></ul>"
+)
+SECTIONS = split_sections(POST)
+
+@pytest.mark.parametrize("feedback", [
+    "Mention cloud spending throughout",
+    "Cite trending tools in every section",
+    "Add a disclosing note about sponsors",
+    "Introduce more examples everywhere",
+    "The tone feels hooked on jargon",
+    "Explain the webhook setup",
+    "Name the wrapper library",
+    "Don't dictate to the reader",
+])
+def test_substrings_are_not_section_words(feedback):
+    assert guess_sections(SECTIONS, feedback) == []
+
+@pytest.mark.parametrize("feedback, picks", [
+    ("Make the intro punchier", [0]),
+    ("Rewrite the introduction", [0]),
+    ("Stronger hook please", [0]),
+    ("The ending drags", [3]),
+    ("Wrap up faster with a clear CTA", [3]),
+    ("Shorten the opening and the closing", [0, 3]),
+    ("Add numbers to Cutting waste", [2]),
+])
+def test_section_words_and_titles(feedback, picks):
+    assert guess_sections(SECTIONS, feedback) == picks